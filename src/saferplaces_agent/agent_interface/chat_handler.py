@@ -6,16 +6,97 @@ import html
 from datetime import datetime
 from typing import List, Dict, Any, Optional
 
-from langgraph.types import Command, Interrupt
-from langchain_core.messages import SystemMessage, AIMessage, HumanMessage, ToolMessage, AnyMessage
+from langgraph.types import Interrupt
+from langchain_core.messages import AnyMessage
 
-from IPython.display import display, Markdown, clear_output
+# DOC: IPython.display is imported lazily by the notebook commands → the Flask server never loads IPython
+
+try:
+    import orjson     # DOC: optional, faster pretty-printing of tool args / interrupts in the chat markdown
+except ImportError:
+    orjson = None
 
 from ..common import s3_utils, utils
 from .graph_interface import GraphInterface
 
 from . import __GRAPH_REGISTRY__
 
+
+# DOC: Rendering constants and helpers of the chat markdown, built once at import instead of on every chat_to_markdown call
+_ROLE_META = {
+    "user":      {"emoji": "👤", "label": "User", "color": "#1f6feb"},
+    "ai":        {"emoji": "🤖", "label": "Assistant", "color": "#8250df"},
+    "tool":      {"emoji": "🛠️", "label": "Tool", "color": "#3fb950"},
+    "interrupt": {"emoji": "⏸️", "label": "Interrupt", "color": "#d29922"},
+    # fallback handled in code
+}
+
+# DOC: Per-message header (separator, title, anchor) and TOC entry, filled with a single format call each
+_MSG_HEADER_TMPL = "---\n### {i:02d} · {role_title}\n<a id='msg-{i:02d}'></a>"
+_TOC_LINE_TMPL = "- [{i:02d} · {role_title} – {snippet}](#msg-{i:02d})"
+
+# DOC: "emoji label" is constant per role → pre-formatted once instead of interpolated for every header and TOC entry
+_ROLE_TITLES = { role: f"{meta['emoji']} {meta['label']}" for role, meta in _ROLE_META.items() }
+
+
+def _role_title(role: str) -> str:
+    """Emoji e label del ruolo, con fallback per ruoli sconosciuti."""
+    return _ROLE_TITLES.get(role) or f"📦 {role.capitalize()}"
+
+
+def _toc_snippet(content: Any) -> str:
+    """Prima riga non vuota del contenuto, troncata a 80 caratteri."""
+    # DOC: partition stops at the first newline → no list of all the lines of long tool outputs
+    snippet = (content or "").lstrip().partition("\n")[0].rstrip() or "(vuoto)"
+    return snippet[:77] + "…" if len(snippet) > 80 else snippet
+
+
+def _fence(text: str, lang: str = "") -> str:
+    """
+    Ritorna un fenced code block che non collida con eventuali triple backtick nel testo.
+    Se nel testo compaiono ``` usa ```` come recinzione.
+    """
+    fence = "```"
+    if "```" in text:
+        fence = "````"
+    lang_tag = lang if lang else ""
+    return f"{fence}{lang_tag}\n{text}\n{fence}"
+
+
+def _pretty(obj: Any) -> str:
+    """Pretty JSON (anche da dict Python), con fallback su str()."""
+    try:
+        if orjson is not None:
+            return orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS).decode('utf-8')
+        return json.dumps(obj, ensure_ascii=False, indent=2)
+    except Exception:
+        return str(obj)
+
+
+def _maybe_parse_python_like_dict(s: str) -> Any:
+    """
+    Alcuni tool restituiscono stringhe con apici singoli (non JSON valido).
+    Provo prima json.loads (caso comune, in C), poi ast.literal_eval, altrimenti torna la stringa originale.
+    """
+    # DOC: Only containers / quoted strings are worth parsing → plain text skips both parsers
+    head = s.lstrip()[:1]
+    if not head or head not in '{["':
+        return s
+    try:
+        return json.loads(s)
+    except Exception:
+        try:
+            return ast.literal_eval(s)
+        except Exception:
+            return s
+
+
+def _esc(x: Any) -> str:
+    # Escape per contenuto HTML/Markdown incluso in tag HTML
+    return html.escape(str(x), quote=True)
+
+
+
 class ChatMarkdownHandler:
     
     def __init__(self, graph_interface: GraphInterface = None, thread_id: str = None, user_id: str = None, **gi_kwargs):
@@ -38,6 +119,9 @@ class ChatMarkdownHandler:
         else:
             self.graph_interface = graph_interface
         
+        # DOC: (cache key, markdown) of the last /history render
+        self._history_markdown = None
+        
         
     def chat_to_markdown(
         self,
@@ -59,7 +143,7 @@ class ChatMarkdownHandler:
         
         if chat is None:
             chat = self.events
-        chat = self.graph_interface.conversation_handler.chat2json(chat)
+        chat = self.graph_interface.conversation_handler.chat2json(chat, include_parsed=True)
         if not chat:
             return None
         
@@ -67,92 +151,47 @@ class ChatMarkdownHandler:
             title = self.graph_interface.conversation_handler.title if self.graph_interface.conversation_handler.title else f"Chat Markdown {datetime.now().isoformat()}"
                     
         
-        ROLE_META = {
-            "user":      {"emoji": "👤", "label": "User", "color": "#1f6feb"},
-            "ai":        {"emoji": "🤖", "label": "Assistant", "color": "#8250df"},
-            "tool":      {"emoji": "🛠️", "label": "Tool", "color": "#3fb950"},
-            "interrupt": {"emoji": "⏸️", "label": "Interrupt", "color": "#d29922"},
-            # fallback handled in code
-        }
-
-        def _fence(text: str, lang: str = "") -> str:
-            """
-            Ritorna un fenced code block che non collida con eventuali triple backtick nel testo.
-            Se nel testo compaiono ``` usa ```` come recinzione.
-            """
-            fence = "```"
-            if "```" in text:
-                fence = "````"
-            lang_tag = lang if lang else ""
-            return f"{fence}{lang_tag}\n{text}\n{fence}"
-
-        def _pretty(obj: Any) -> str:
-            """Pretty JSON (anche da dict Python), con fallback su str()."""
-            try:
-                return json.dumps(obj, ensure_ascii=False, indent=2)
-            except Exception:
-                return str(obj)
-
-        def _maybe_parse_python_like_dict(s: str) -> Any:
-            """
-            Alcuni tool restituiscono stringhe con apici singoli (non JSON valido).
-            Provo a fare ast.literal_eval e poi convertirlo a JSON-friendly.
-            """
-            try:
-                val = ast.literal_eval(s)
-                return val
-            except Exception:
-                # Prova JSON diretto, altrimenti torna la stringa originale
-                try:
-                    return json.loads(s)
-                except Exception:
-                    return s
         now = datetime.now().strftime("%Y-%m-%d %H:%M")
         lines: List[str] = []
+        # DOC: Local bindings → the per-line appends and role lookups below are LOAD_FAST instead of attribute/global lookups
+        append = lines.append
+        role_title = _role_title
 
 
         if include_header:
             # Front matter leggero (opzionale)
-            lines.append(f"---")
-            lines.append(f'title: "{title}"')
+            append(f"---")
+            append(f'title: "{title}"')
             if subtitle:
-                lines.append(f'subtitle: "{subtitle}"')
-            lines.append(f"generated: {now}")
-            lines.append(f"---\n")
+                append(f'subtitle: "{subtitle}"')
+            append(f"generated: {now}")
+            append(f"---\n")
 
             # Header
-            lines.append(f"# {title}")
+            append(f"# {title}")
             if subtitle:
-                lines.append(f"_{subtitle}_")
-            lines.append(f"*Generato il {now}*")
-            lines.append("")
-            lines.append("**Legenda**: 👤 User · 🤖 Assistant · 🛠️ Tool · ⏸️ Interrupt")
-            lines.append("")
+                append(f"_{subtitle}_")
+            append(f"*Generato il {now}*")
+            append("")
+            append("**Legenda**: 👤 User · 🤖 Assistant · 🛠️ Tool · ⏸️ Interrupt")
+            append("")
 
             # TOC
             if include_toc:
-                lines.append("## Indice")
-                for i, msg in enumerate(chat, 1):
-                    role = msg.get("role", "unknown")
-                    meta = ROLE_META.get(role, {"emoji": "📦", "label": role.capitalize()})
-                    snippet = (msg.get("content") or "").strip().split("\n")[0]
-                    snippet = snippet if snippet else "(vuoto)"
-                    # Limita snippet
-                    if len(snippet) > 80:
-                        snippet = snippet[:77] + "…"
-                    lines.append(f"- [{i:02d} · {meta['emoji']} {meta['label']} – {snippet}](#msg-{i:02d})")
-                lines.append("")
+                append("## Indice")
+                # DOC: All the TOC entries built in one comprehension and added with a single extend
+                lines.extend([
+                    _TOC_LINE_TMPL.format(i=i, snippet=_toc_snippet(msg.get("content")), role_title=role_title(msg.get("role", "unknown")))
+                    for i, msg in enumerate(chat, 1)
+                ])
+                append("")
 
         # Messaggi
         for i, msg in enumerate(chat, 1):
             role = msg.get("role", "unknown")
             content = msg.get("content") or ""
-            meta = ROLE_META.get(role, {"emoji": "📦", "label": role.capitalize(), "color": "#6e7781"})
-            emoji, label = meta["emoji"], meta["label"]
 
-            lines.append(f"---")
-            lines.append(f"### {i:02d} · {emoji} {label}")
-            lines.append(f"<a id='msg-{i:02d}'></a>")
+            append(_MSG_HEADER_TMPL.format(i=i, role_title=role_title(role)))
 
             # Badge ruoli & extra info
             extras = []
@@ -165,7 +204,7 @@ class ChatMarkdownHandler:
                 extras.append(_fence(_pretty(msg["resume_interrupt"]), "json"))
 
             if extras:
-                lines.append("")
+                append("")
                 lines.extend(extras)
 
             # Corpo messaggio
@@ -173,61 +212,64 @@ class ChatMarkdownHandler:
                 # Se sembra codice Python (inizia con "The generated code is as follows:" o contiene ```python)
                 if "```" in content:
                     # già formattato: lo includo così com'è
-                    lines.append("")
-                    lines.append(content)
+                    append("")
+                    append(content)
                 else:
                     # messaggio normale: uso blockquote per user/ai, code fence per tool se è strutturato
                     if role in ("user", "ai"):
-                        lines.append("")
-                        for ln in content.splitlines():
-                            lines.append(f"> {ln}" if ln.strip() else ">")
+                        append("")
+                        # DOC: One extend per message instead of one append per content line
+                        lines.extend(f"> {ln}" if ln.strip() else ">" for ln in content.splitlines())
                     elif role in ("tool", "interrupt"):
                         # spesso i tool mandano json/stringhe strutturate
-                        parsed = _maybe_parse_python_like_dict(content)
+                        # DOC: Structured output carried by chat2json → no round trip through the stringified content
+                        parsed = msg.get("content_parsed")
+                        if parsed is None:
+                            parsed = _maybe_parse_python_like_dict(content)
                         if isinstance(parsed, (dict, list)):
-                            lines.append("")
-                            lines.append(_fence(_pretty(parsed), "json"))
+                            append("")
+                            append(_fence(_pretty(parsed), "json"))
                         else:
-                            lines.append("")
-                            lines.append(_fence(str(parsed), ""))
+                            append("")
+                            append(_fence(str(parsed), ""))
                     else:
-                        lines.append("")
-                        lines.append(content)
+                        append("")
+                        append(content)
             else:
                 # nessun contenuto, ma potrebbero esserci tool_calls
                 if role in ("ai", "tool", "interrupt"):
                     pass  # gestito sotto se ci sono tool_calls
                 else:
-                    lines.append("\n_(nessun contenuto)_")
+                    append("\n_(nessun contenuto)_")
 
             # tool_calls (tipicamente dentro messaggi 'ai')
             tcs = msg.get("tool_calls") or []
             if tcs:
-                lines.append("")
-                lines.append("<details>")
-                lines.append("<summary><strong>Tool calls</strong></summary>\n")
+                append("")
+                append("<details>")
+                append("<summary><strong>Tool calls</strong></summary>\n")
                 for j, tc in enumerate(tcs, 1):
                     name = tc.get("name") or tc.get("tool")
                     tc_id = tc.get("id") or tc.get("tool_call_id")
                     args = tc.get("args") or {}
                     tc_type = tc.get("type") or ""
-                    lines.append(f"**{j}. {name}**  ")
+                    append(f"**{j}. {name}**  ")
                     if tc_type:
-                        lines.append(f"- Tipo: `{tc_type}`")
+                        append(f"- Tipo: `{tc_type}`")
                     if tc_id:
-                        lines.append(f"- ID: `{tc_id}`")
+                        append(f"- ID: `{tc_id}`")
                     if args:
-                        lines.append("- Args:")
-                        lines.append(_fence(_pretty(args), "json"))
+                        append("- Args:")
+                        append(_fence(_pretty(args), "json"))
                     # altri campi grezzi, se presenti
                     extra_keys = {k: v for k, v in tc.items() if k not in {"name","args","id","type"}}
                     if extra_keys:
-                        lines.append("- Extra:")
-                        lines.append(_fence(_pretty(extra_keys), "json"))
-                    lines.append("")
-                lines.append("</details>")
+                        append("- Extra:")
+                        append(_fence(_pretty(extra_keys), "json"))
+                    append("")
+                append("</details>")
 
-            lines.append("")
+            append("")
 
         markdown = "\n".join(lines).rstrip() + "\n"
 
@@ -245,25 +287,21 @@ class ChatMarkdownHandler:
         una stringa Markdown compatta, con metadati espandibili via <details>.
         Pensata per l'uso con: display(Markdown(layers_to_markdown(layers))).
         """
-        def esc(x: Any) -> str:
-            # Escape per contenuto HTML/Markdown incluso in tag HTML
-            return html.escape(str(x), quote=True)
-
         lines = []
-        for i, layer in enumerate(layers, 1):
-            title = esc(layer.get("title", ""))
-            desc = esc(layer.get("description", ""))
-            src = esc(layer.get("src", ""))
-            ltype = esc(layer.get("type", ""))
+        for layer in layers:
+            title = _esc(layer.get("title", ""))
+            desc = _esc(layer.get("description", ""))
+            src = _esc(layer.get("src", ""))
+            ltype = _esc(layer.get("type", ""))
 
             lines.append(f"**{title}** — _{desc}_ — `{ltype}`")
             if src:
-                url_link = utils.s3uri_to_https(src) if src.startswith("s3://") else src
+                url_link = utils.s3uri_to_https(src)     # DOC: non-S3 sources are returned unchanged by s3uri_to_https itself
                 lines.append(f"- src: [{src}]({url_link})")
                 
             md = layer.get("metadata", {})
             if isinstance(md, dict) and md:
-                items = "".join(f"<li><code>{esc(k)}</code>: <code>{esc(v)}</code></li>" for k, v in md.items())
+                items = "".join(f"<li><code>{_esc(k)}</code>: <code>{_esc(v)}</code></li>" for k, v in md.items())
                 lines.append(
                     "- <details><summary>metadata</summary>"
                     f"<ul>{items}</ul>"
@@ -274,16 +312,6 @@ class ChatMarkdownHandler:
         return "\n".join(lines)
     
             
-    class ChatMarkdownBreak(StopIteration):
-        """Custom exception to stop the chat markdown generator."""
-        def __init__(self, message="Chat markdown generation stopped."):
-            super().__init__(message)
-            
-    class ChatMarkdownContinue(Exception):
-        """Custom exception to continue the chat markdown generator."""
-        def __init__(self, message="Chat markdown generation continued."):
-            super().__init__(message)
-            
     class ChatMarkdownCommand():
         NEW_CHAT = 'new-chat'
         RESET = 'reset'
@@ -296,136 +324,154 @@ class ChatMarkdownHandler:
         EXIT = 'exit'
         QUIT = 'quit'
         HELP = 'help'
+    
+    # DOC: Commands are fixed → the /help text is built once, listing the command strings the user actually types
+    _HELP_TEXT = "Available commands:\n" + "\n".join(
+        f"/{cmd}: {cmd.replace('-', ' ').capitalize()}"
+        for name, cmd in vars(ChatMarkdownCommand).items() if not name.startswith('_')
+    )
+        
+    def _command_new_chat(self):
+        from IPython.display import clear_output
+        clear_output()
+        new_thread_id = str(uuid.uuid4())
+        print(f"Starting a new chat with thread_id={new_thread_id}.")
+        self.graph_interface = __GRAPH_REGISTRY__.register(
+            thread_id=new_thread_id,
+            user_id=self.graph_interface.user_id,
+            project_id=self.graph_interface.project_id,
+            map_handler=self.graph_interface.map_handler
+        )
+        self._history_markdown = None
+
+    def _command_reset(self):
+        print("--- TO BE IMPLEMENTED ---")
+
+    def _command_layers(self):
+        from IPython.display import display, Markdown
+        layers = self.graph_interface.get_state('layer_registry')
+        if len(layers) > 0:
+            display(Markdown(self.layers_to_markdown(layers)))
+        else:
+            print("No layers available in the layer registry.")
+
+    def _command_add_layer(self):
+        src = input("Enter the source URL for the layer (e.g., s3://bucket/path/to/layer.geojson): ")
+        title = input("Enter the title for the layer (just a label): ")
+        description = input("Enter a description for the layer (optional but recommended): ")
+        inferred_layer_type = 'raster' if src.endswith(('.tif', '.tiff')) else 'vector'
+        layer_type = input(f"Enter the layer type (default is '{inferred_layer_type}'): ") or inferred_layer_type
+
+        if layer_type=='raster':
+            metadata_nodata = input("Enter the nodata value for the raster layer (optional, default is nan): ")
+            try:
+                metadata_nodata = float(metadata_nodata) if metadata_nodata else 'nan'
+            except ValueError:
+                metadata_nodata = 'nan'
+            metadata_colormap_name = input("Enter the colormap name for the raster layer (optional, default is 'viridis'): ") or 'viridis'
+            metadata = {
+                "nodata": metadata_nodata,
+                "colormap_name": metadata_colormap_name
+            }
+        elif layer_type=='vector':
+            metadata = dict()
+
+        self.graph_interface.register_layer(
+            src=src,
+            title=title,
+            description=description,
+            layer_type=layer_type,
+            metadata=metadata
+        )
+
+    def _command_clear(self):
+        from IPython.display import clear_output
+        clear_output()
+
+    def _command_history(self):
+        from IPython.display import display, Markdown, clear_output
+        chat_events = self.graph_interface.conversation_events
+        if len(chat_events) > 0:
+            clear_output()
+            # DOC: The header-less render has no timestamp → same conversation version means same markdown (the cache is reset with the graph interface on new-chat)
+            history_key = self.graph_interface.conversation_version
+            if self._history_markdown is None or self._history_markdown[0] != history_key:
+                self._history_markdown = (history_key, self.chat_to_markdown(chat=chat_events, include_header=False))
+            display(Markdown(self._history_markdown[1]))
+        else:
+            print("No past messages in the conversation.")
+
+    def _command_map(self):
+        from IPython.display import display
+        if self.graph_interface.map_handler:
+            display(self.graph_interface.map_handler.m)
+            return self._CMD_BREAK       # DOC: Map displayed
+        else:
+            print("No map handler available.")
+
+    def _command_export(self):
+        from IPython.display import display, Markdown
+        export_path = input(f"Enter the filename to save the chat markdown file (default is chat_{self.graph_interface.thread_id}.md'): ")
+        export_path = export_path or f"chat_{self.graph_interface.thread_id}.md"
+        title = input("Enter the title for the chat (optional): ") or None
+        self.chat_to_markdown(
+            chat=self.graph_interface.conversation_events,
+            path=export_path,
+            title=title,
+            subtitle="Exported conversation",
+            include_toc=True,
+            include_header=True
+        )
+        export_uri = f"{s3_utils._BASE_BUCKET}/conversations/{self.graph_interface.thread_id}/{export_path}"
+        s3_utils.s3_upload(filename=export_path, uri=export_uri, remove_src=True)
+        export_url = html.escape(utils.s3uri_to_https(export_uri), quote=True)
+        display(Markdown(f"Chat exported to: [{export_uri}]({export_url})"))
+
+    def _command_exit(self):
+        print("Exiting the conversation.")
+        return self._CMD_BREAK
+
+    def _command_help(self):
+        print(self._HELP_TEXT)
+
+    # DOC: Outcome of a command for the run() loop → plain return values, no exceptions as control flow
+    _CMD_CONTINUE = 'continue'
+    _CMD_BREAK = 'break'
+    
+    # DOC: Command → handler, resolved with a single dict lookup (exit and quit share the same handler)
+    _COMMAND_HANDLERS = {
+        ChatMarkdownCommand.NEW_CHAT: _command_new_chat,
+        ChatMarkdownCommand.RESET: _command_reset,
+        ChatMarkdownCommand.LAYERS: _command_layers,
+        ChatMarkdownCommand.ADD_LAYER: _command_add_layer,
+        ChatMarkdownCommand.CLEAR: _command_clear,
+        ChatMarkdownCommand.HISTORY: _command_history,
+        ChatMarkdownCommand.MAP: _command_map,
+        ChatMarkdownCommand.EXPORT: _command_export,
+        ChatMarkdownCommand.EXIT: _command_exit,
+        ChatMarkdownCommand.QUIT: _command_exit,
+        ChatMarkdownCommand.HELP: _command_help,
+    }
         
-    def handle_command(self, command: str):
+    def handle_command(self, command: str) -> str:
         """
         Handle chat markdown commands based on the command string.
         Args:
             command (str): The command string to handle.
             self.graph_interface_istance (GraphInterface): The GraphInterface instance to use for handling commands.
+        Returns:
+            str: _CMD_BREAK if the conversation has to stop, _CMD_CONTINUE otherwise.
         """
+        command_handler = self._COMMAND_HANDLERS.get(command)
+        if command_handler is not None:
+            return command_handler(self) or self._CMD_CONTINUE
         
-        def command_new_chat():
-            clear_output()
-            new_thread_id = str(uuid.uuid4())
-            print(f"Starting a new chat with thread_id={new_thread_id}.")
-            self.graph_interface = __GRAPH_REGISTRY__.register(
-                thread_id=new_thread_id,
-                user_id=self.graph_interface.user_id,
-                project_id=self.graph_interface.project_id,
-                map_handler=self.graph_interface.map_handler
-            )
-            
-        def command_reset():
-            print("--- TO BE IMPLEMENTED ---")
-        
-        def command_layers():
-            layers = self.graph_interface.get_state('layer_registry')
-            if len(layers) > 0:
-                display(Markdown(self.layers_to_markdown(layers)))
-            else:
-                print("No layers available in the layer registry.")
-                
-        def command_add_layer():
-            src = input("Enter the source URL for the layer (e.g., s3://bucket/path/to/layer.geojson): ")
-            title = input("Enter the title for the layer (just a label): ")
-            description = input("Enter a description for the layer (optional but recommended): ")
-            inferred_layer_type = 'raster' if src.endswith(('.tif', '.tiff')) else 'vector'
-            layer_type = input(f"Enter the layer type (default is '{inferred_layer_type}'): ") or inferred_layer_type
-            
-            if layer_type=='raster':
-                metadata_nodata = input("Enter the nodata value for the raster layer (optional, default is nan): ")
-                try:
-                    metadata_nodata = float(metadata_nodata) if metadata_nodata else 'nan'
-                except ValueError:
-                    metadata_nodata = 'nan'
-                metadata_colormap_name = input("Enter the colormap name for the raster layer (optional, default is 'viridis'): ") or 'viridis'
-                metadata = {
-                    "nodata": metadata_nodata,
-                    "colormap_name": metadata_colormap_name
-                }
-            elif layer_type=='vector':
-                metadata = dict()
-            
-            self.graph_interface.register_layer(
-                src=src,
-                title=title,
-                description=description,
-                layer_type=layer_type,
-                metadata=metadata
-            )
-            
-        def command_clear():
-            clear_output()
-            
-        def command_history():
-            chat_events = self.graph_interface.conversation_events
-            if len(chat_events) > 0:
-                clear_output()
-                display(Markdown(self.chat_to_markdown(chat=chat_events, include_header=False)))
-            else:
-                print("No past messages in the conversation.")
-            
-        def command_map():
-            if self.graph_interface.map_handler:
-                display(self.graph_interface.map_handler.m)
-                raise self.ChatMarkdownBreak("Map displayed.")
-            else:
-                print("No map handler available.")
-                
-        def command_export():
-            export_path = input(f"Enter the filename to save the chat markdown file (default is chat_{self.graph_interface.thread_id}.md'): ")
-            export_path = export_path or f"chat_{self.graph_interface.thread_id}.md"
-            title = input("Enter the title for the chat (optional): ") or None
-            self.chat_to_markdown(
-                chat=self.graph_interface.conversation_events,
-                path=export_path,
-                title=title,
-                subtitle="Exported conversation",
-                include_toc=True,
-                include_header=True
-            )
-            export_uri = f"{s3_utils._BASE_BUCKET}/conversations/{self.graph_interface.thread_id}/{export_path}"
-            s3_utils.s3_upload(filename=export_path, uri=export_uri, remove_src=True)
-            export_url = html.escape(utils.s3uri_to_https(export_uri), quote=True)
-            display(Markdown(f"Chat exported to: [{export_uri}]({export_url})"))
-                
-        def command_exit():
-            print("Exiting the conversation.")
-            raise self.ChatMarkdownBreak("Exiting the conversation.")
-        
-        def command_help():
-            commands = [cmd for cmd in dir(self.ChatMarkdownCommand) if not cmd.startswith('_')]
-            help_text = "\n".join([f"/{cmd}: {cmd.replace('_', ' ').capitalize()}" for cmd in commands])
-            print(f"Available commands:\n{help_text}")
-        
-        if command == self.ChatMarkdownCommand.NEW_CHAT:
-            command_new_chat()
-        elif command == self.ChatMarkdownCommand.RESET:
-            command_reset()
-        elif command == self.ChatMarkdownCommand.LAYERS:
-            command_layers()
-        elif command == self.ChatMarkdownCommand.ADD_LAYER:
-            command_add_layer()
-        elif command == self.ChatMarkdownCommand.CLEAR:
-            command_clear()
-        elif command == self.ChatMarkdownCommand.HISTORY:
-            command_history()
-        elif command == self.ChatMarkdownCommand.MAP:
-            command_map()
-        elif command == self.ChatMarkdownCommand.EXPORT:
-            command_export()
-        elif command == self.ChatMarkdownCommand.EXIT or command == self.ChatMarkdownCommand.QUIT:
-            command_exit()
-        elif command == self.ChatMarkdownCommand.HELP:
-            command_help()
-        else:
-            print(f"Unknown command: {command}")
-        
-        raise self.ChatMarkdownContinue("Continuing the conversation after command.")
+        print(f"Unknown command: {command}")
+        return self._CMD_CONTINUE
     
     
     def run(self):
+        from IPython.display import display, Markdown
         def markdown_interaction(user_prompt: str, display_output: bool = True):
             gen = (
                 Markdown(self.chat_to_markdown(chat=e, include_header=False))
@@ -446,12 +492,9 @@ class ChatMarkdownHandler:
             
             if p.startswith('/'):
                 command = p[1:].strip()
-                try:
-                    self.handle_command(command)
-                except self.ChatMarkdownBreak:
+                if self.handle_command(command) is self._CMD_BREAK:
                     break
-                except self.ChatMarkdownContinue:
-                    continue
+                continue
                     
             for md in markdown_interaction(p, display_output=True):
                 continue
\ No newline at end of file
@@ -2,8 +2,10 @@ import os
 import re
 import uuid
 import json
-
-import geopandas as gpd
+import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
 from markupsafe import escape
 
@@ -35,6 +37,48 @@ def index():
     return jsonify("Welcome to the SaferPlaces Agent Interface!"), 200
 
 
+class _TTLCache:
+    """Small thread-safe LRU whose entries expire after `ttl` seconds."""
+    
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() - entry[0] >= self.ttl:
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+        
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+
+_PROJECT_RE = re.compile(r'project=(dev-\d+)')
+
+# DOC: Short-lived cache of the user projects (S3 listing) → polling clients don't hit S3 on every request, new projects show up within the TTL
+_USER_PROJECTS = _TTLCache(maxsize=512, ttl=30)
+
+def _list_user_projects(user_id: str) -> list[str]:
+    user_project = _USER_PROJECTS.get(user_id)
+    if user_project is not None:
+        return user_project
+    
+    user_bucket_files = s3_utils.list_s3_files(f's3://{os.getenv("BUCKET_NAME", "saferplaces.co")}/{os.getenv("BUCKET_OUT_DIR", "SaferPlaces-Agent/dev")}/user={user_id}')
+    user_project = sorted({ m.group(1) for p in user_bucket_files if (m := _PROJECT_RE.search(p)) })
+    
+    _USER_PROJECTS.set(user_id, user_project)
+    return user_project
+
+
 @app.route('/user', methods=['POST'])
 def user():
     data = request.get_json(silent=True) or {}
@@ -43,8 +87,7 @@ def user():
     if not user_id:
         return jsonify({"error": "User ID is required"}), 400
     
-    user_bucket_files = s3_utils.list_s3_files(f's3://{os.getenv("BUCKET_NAME", "saferplaces.co")}/{os.getenv("BUCKET_OUT_DIR", "SaferPlaces-Agent/dev")}/user={user_id}')
-    user_project = sorted(list(set([re.search(r'project=(dev-\d+)', p).group(1) for p in user_bucket_files if 'project=' in p])))
+    user_project = _list_user_projects(user_id)
     
     return jsonify({
         "user_id": user_id,
@@ -103,9 +146,11 @@ def prompt(thread_id):
     stream_mode = data.get('stream', False)
     
     if stream_mode:
+        # DOC: Events arrive seconds apart (LLM / tool calls) → flush each one as soon as it is ready, but skip graph updates that carry no new message
         def generate():
             for e in gi.user_prompt(prompt=prompt, state_updates={'avaliable_tools': []}):
-                yield json.dumps(gi.conversation_handler.chat2json(chat=e)) + "\n"
+                if e:
+                    yield json.dumps(gi.conversation_handler.chat2json(chat=e), separators=(',', ':'), ensure_ascii=False) + "\n"     # DOC: compact NDJSON lines → fewer bytes per event
         
         return Response(generate(), mimetype='text/plain')
     
@@ -129,10 +174,46 @@ def layers(thread_id):
     return jsonify(layers), 200
 
 
+# DOC: Converted sources are written next to the original with a deterministic name → a recent result can be reused without re-reading headers or probing S3
+_RENDER_SRCS = _TTLCache(maxsize=256, ttl=300)
+_RENDER_MAX_WORKERS = 4
+
+def _render_src(layer_src: str, layer_type: str, **cog_kwargs) -> str:
+    """Convert a layer source to its web-renderable version (GeoJSON EPSG:4326 or COG EPSG:3857)."""
+    render_key = (s3_utils._BASE_BUCKET, layer_src, layer_type)     # DOC: non-S3 sources are converted into the current project bucket
+    render_src = _RENDER_SRCS.get(render_key)
+    if render_src is not None:
+        return render_src
+    if layer_type == 'vector':
+        render_src = utils.vector_to_geojson4326(layer_src)
+    elif layer_type == 'raster':
+        render_src = utils.tif_to_cog3857(layer_src, **cog_kwargs)
+    else:
+        raise ValueError(f"Layer type '{layer_type}' is not supported")
+    _RENDER_SRCS.set(render_key, render_src)
+    return render_src
+
+
 @app.route('/t/<thread_id>/render', methods=['POST'])
 def render_layer(thread_id):
     data = request.get_json(silent=True) or dict()
 
+    # DOC: Many layers at once (e.g. all the Digital Twin outputs) → convert them concurrently
+    layers_data = data.get('layers_data', None)
+    if layers_data:
+        if not isinstance(layers_data, list) or any(not isinstance(ld, dict) for ld in layers_data):
+            return jsonify({"error": "Layers data must be a list of layer objects"}), 400
+        if any(not ld.get('src') or not ld.get('type') for ld in layers_data):
+            return jsonify({"error": "Layer source and type are required for each layer"}), 400
+        if any(ld['type'] not in ('vector', 'raster') for ld in layers_data):
+            return jsonify({"error": "Layer type is not supported"}), 400
+        # DOC: Bounded pool and CPUs split among the conversions → one request cannot saturate the server (GDAL would use ALL_CPUS per COG)
+        max_workers = min(_RENDER_MAX_WORKERS, len(layers_data))
+        cog_threads = str(max(1, (os.cpu_count() or 1) // max_workers))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            layer_render_srcs = list(executor.map(lambda ld: _render_src(ld['src'], ld['type'], NUM_THREADS=cog_threads), layers_data))
+        return jsonify({'srcs': [utils.s3uri_to_https(src) for src in layer_render_srcs]}), 200
+
     layer_data = data.get('layer_data', None)
     if not layer_data:
         return jsonify({"error": "Layer data is required"}), 400
@@ -158,12 +239,9 @@ def render_layer(thread_id):
     if not layer_type:
         return jsonify({"error": "Layer type is required"}), 400
     
-    if layer_type == 'vector':
-        layer_render_src = utils.vector_to_geojson4326(layer_src)
-    elif layer_type == 'raster':
-        layer_render_src = utils.tif_to_cog3857(layer_src)
-            
-    else:
+    if layer_type not in ('vector', 'raster'):
         return jsonify({"error": f"Layer type '{layer_type}' is not supported"}), 400
+    
+    layer_render_src = _render_src(layer_src, layer_type)
         
-    return jsonify({'src': utils.s3uri_to_https(layer_render_src)}), 200
\ No newline at end of file
+    return jsonify({'src': utils.s3uri_to_https(layer_render_src)}), 200
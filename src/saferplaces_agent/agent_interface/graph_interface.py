@@ -1,6 +1,9 @@
 import os
 import json
 import uuid
+import time
+import threading
+from collections import OrderedDict
 from textwrap import indent
 import datetime
 
@@ -22,17 +25,22 @@ from .leafmap_interface import LeafmapInterface
 
 
 
+# DOC: Upper bound of the graph steps (LLM / tool calls) computed at the same time across all the threads → stays under the LLM provider rate limits
+_LLM_SEMAPHORE = threading.BoundedSemaphore(int(os.getenv('LLM_CONCURRENCY', '4')))
+
+
 class ConversationHandler:
     
     title = None
     subtitle = None
-    events: list[AnyMessage | Interrupt] = []
-    new_events: list[AnyMessage | Interrupt] = []
     
     def __init__(self, chat_id=None, title=None, subtitle=None):
         self.chat_id = chat_id
         self.title = title
         self.subtitle = subtitle
+        # DOC: Per-conversation lists → class-level defaults were shared by every handler, mixing the messages of all threads
+        self.events: list[AnyMessage | Interrupt] = []
+        self.new_events: list[AnyMessage | Interrupt] = []
         
     def add_events(self, event: AnyMessage | Interrupt | list[AnyMessage | Interrupt]):
         if isinstance(event, list):
@@ -51,9 +59,10 @@ class ConversationHandler:
         return new_events
     
     
-    def chat2json(self, chat: list[AnyMessage | Interrupt] | None = None) -> list[dict]:
+    def chat2json(self, chat: list[AnyMessage | Interrupt] | None = None, include_parsed: bool = False) -> list[dict]:
         """
         Convert a chat to a JSON string.
+        With include_parsed, tool messages also carry their structured output as content_parsed (for local renderers, not for HTTP payloads).
         """
     
         if chat is None:
@@ -74,13 +83,16 @@ class ConversationHandler:
             }
             
         def tool_message_to_dict(msg: ToolMessage) -> dict:
-            return {
+            tool_dict = {
                 "role": "tool",
                 "content": msg.content,
                 "name": msg.name,
                 "id": msg.id,
                 "tool_call_id": msg.tool_call_id
             }
+            if include_parsed and isinstance(msg.artifact, (dict, list)):
+                tool_dict["content_parsed"] = msg.artifact
+            return tool_dict
             
         def interrupt_to_dict(msg: Interrupt) -> dict:
             return {
@@ -120,10 +132,14 @@ class GraphInterface:
         self.project_id = project_id
 
         self.interrupt = None
+        self._graph_state = None     # DOC: last snapshot of the graph state, reset after every graph run / event
+        self._layer_registry_dirty = False     # DOC: layer registry changed since the last upload to S3
+        self._prompt_lock = threading.Lock()     # DOC: one user_prompt at a time per thread → conversation events and interrupt are not mutated concurrently
 
         self.config = { "configurable": { "thread_id": self.thread_id } }
         
         self.conversation_events = []
+        self.conversation_version = 0     # DOC: incremented on every update_events → renders of the conversation can be cached on it
         self.conversation_handler = ConversationHandler(chat_id=self.thread_id, title=f"Chat {user_id}", subtitle=f"Thread {thread_id}")
         
         self.map_handler = None
@@ -137,21 +153,26 @@ class GraphInterface:
             
         
         s3_utils.setup_base_bucket(user_id=self.user_id, project_id=self.project_id)
+        # DOC: Resolved once → _BASE_BUCKET is process-global and is repointed by every new session, uploads must keep going to this thread's project
+        self._layer_registry_uri = f'{s3_utils._BASE_BUCKET}/layer_registry.json'
+        self._layer_registry_fp = os.path.join(os.getcwd(), f'{self.user_id}__{self.project_id}__layer_registry.json')   # TODO: TMP DIR! + garbage collect
         self.restore_state()
              
             
     @property
     def graph_state(self):
         """ graph_state - returns the graph state """
-        return self.G.get_state(self.config).values
+        # DOC: The state only changes through self.G runs of this thread → fetch the snapshot once until the next run
+        if self._graph_state is None:
+            self._graph_state = self.G.get_state(self.config).values
+        return self._graph_state
     
             
     def restore_state(self):
         
         def restore_layer_registry():
-            lr_uri = f'{s3_utils._BASE_BUCKET}/layer_registry.json'
-            print(f"Restoring layer registry from {lr_uri} ...")
-            lr_fp = s3_utils.s3_download(uri=lr_uri, fileout=os.path.join(os.getcwd(), f'{self.user_id}__{self.project_id}__layer_registry.json'))   # TODO: TMP DIR! + garbage collect
+            print(f"Restoring layer registry from {self._layer_registry_uri} ...")
+            lr_fp = s3_utils.s3_download(uri=self._layer_registry_uri, fileout=self._layer_registry_fp)
             if lr_fp is not None and os.path.exists(lr_fp):
                 with open(lr_fp, 'r') as f:
                     layer_registry = json.load(f)
@@ -168,7 +189,9 @@ class GraphInterface:
             input = event_value,
             config = self.config, stream_mode = 'updates'
         ) )
+        self._graph_state = None
         self.on_end_event(event_value)
+        self.flush_layer_registry()
         
         
     def get_state(self, key: str | list | None = None, fallback: Any = None) -> Any:
@@ -204,7 +227,9 @@ class GraphInterface:
             input = event_value,
             config = self.config, stream_mode = 'updates'
         ) )
+        self._graph_state = None
         self.on_end_event(event_value)
+        self.flush_layer_registry()
 
 
     def _event_value_is_interrupt(self, event_value):
@@ -223,6 +248,7 @@ class GraphInterface:
     
     def update_events(self, new_events: AnyMessage | Interrupt | list[AnyMessage | Interrupt]):
         """Update the chat events with new events."""
+        self.conversation_version += 1
         if isinstance(new_events, list):
             self.conversation_events.extend(new_events)
             self.conversation_handler.add_events(new_events)
@@ -230,38 +256,42 @@ class GraphInterface:
             self.conversation_events.append(new_events)
             self.conversation_handler.add_events(new_events)
             
+    def flush_layer_registry(self):
+        """Upload the layer registry to S3 if it changed since the last upload."""
+        if not self._layer_registry_dirty:
+            return
+        self._layer_registry_dirty = False
+        layer_registry = self.get_state('layer_registry')
+        with open(self._layer_registry_fp, 'w') as f:
+            json.dump(layer_registry, f, indent=4)
+        _ = s3_utils.s3_upload(filename=self._layer_registry_fp, uri=self._layer_registry_uri, remove_src= True )
+            
     def on_end_event(self, event_value):
             
+        # DOC: Only mark the registry as changed → it is uploaded once per prompt (flush_layer_registry) instead of once per graph event
         def update_layer_registry(event_value):
             if type(event_value) is dict and event_value.get('layer_registry'):
-                layer_registry = self.get_state('layer_registry')
-                lr_uri = f'{s3_utils._BASE_BUCKET}/layer_registry.json'
-                lr_fp = os.path.join(os.getcwd(), f'{self.user_id}__{self.project_id}__layer_registry.json')
-                with open(lr_fp, 'w') as f:
-                    json.dump(layer_registry, f, indent=4)
-                _ = s3_utils.s3_upload(filename=lr_fp, uri=lr_uri, remove_src= True )
+                self._layer_registry_dirty = True
                 
         def update_map(event_value):
             if self.map_handler and type(event_value) is dict and event_value.get('layer_registry'):
-                is_map_updated = False
-                for layer in event_value['layer_registry']:
-                    is_layer_added = self.map_handler.add_layer(
-                        src=layer['src'],
-                        layer_type=layer['type'],
-                        colormap_name=layer.get('metadata', {}).get('colormap_name', 'viridis'),
-                        nodata=layer.get('metadata', {}).get('nodata', -9999),
-                    )
-                    is_map_updated = is_map_updated or is_layer_added
+                # DOC: a tool can produce many layers at once (e.g. Digital Twin) → prepare them concurrently
+                is_map_updated = self.map_handler.add_layers([
+                    {
+                        'src': layer['src'],
+                        'layer_type': layer['type'],
+                        'colormap_name': layer.get('metadata', {}).get('colormap_name', 'viridis'),
+                        'nodata': layer.get('metadata', {}).get('nodata', -9999),
+                    }
+                    for layer in event_value['layer_registry']
+                ])
                 
         update_layer_registry(event_value)
         update_map(event_value)
         
 
-    def user_prompt(
-        self,
-        prompt: str,
-        state_updates: dict = dict(),
-    ):
+    def _build_stream_input(self, prompt: str, state_updates: dict) -> dict | Command:
+        """Register the user prompt in the conversation and build the graph input (new turn or interrupt resume)."""
         
         def prepare_system_messages():            
             system_messages = []
@@ -270,70 +300,133 @@ class GraphInterface:
                 system_messages.append(GraphStates.build_layer_registry_system_message(state_updates.get('layer_registry', [])))
             return system_messages
         
-        def build_stream():
-            stream_obj = dict()
-            if self.interrupt is not None:
-                self.update_events(HumanMessage(content=prompt, resume_interrupt={ 'interrupt_type': self.interrupt.value['interrupt_type'] }))
-                self.interrupt = None
-                stream_obj = Command(resume={'response': prompt})
-            else:
-                self.update_events(HumanMessage(content=prompt))
-                stream_obj = {
-                    'messages': [
-                        * prepare_system_messages(),
-                        HumanMessage(content=prompt)
-                    ],
-                    'user_id': self.user_id,
-                    'project_id': self.project_id,
-                    'node_params': state_updates.get('node_params', dict()),
-                    'node_history': state_updates.get('node_history', []),
-                    'layer_registry': state_updates.get('layer_registry', []),
-                    'avaliable_tools': state_updates.get('avaliable_tools', self.get_state('avaliable_tools', [])),
-                    'nowtime': datetime.datetime.now(tz=datetime.timezone.utc).replace(tzinfo=None).isoformat(),
-                }
-            return stream_obj
+        stream_obj = dict()
+        if self.interrupt is not None:
+            self.update_events(HumanMessage(content=prompt, resume_interrupt={ 'interrupt_type': self.interrupt.value['interrupt_type'] }))
+            self.interrupt = None
+            stream_obj = Command(resume={'response': prompt})
+        else:
+            self.update_events(HumanMessage(content=prompt))
+            stream_obj = {
+                'messages': [
+                    * prepare_system_messages(),
+                    HumanMessage(content=prompt)
+                ],
+                'user_id': self.user_id,
+                'project_id': self.project_id,
+                'node_params': state_updates.get('node_params', dict()),
+                'node_history': state_updates.get('node_history', []),
+                'layer_registry': state_updates.get('layer_registry', []),
+                'avaliable_tools': state_updates.get('avaliable_tools', self.get_state('avaliable_tools', [])),
+                'nowtime': datetime.datetime.now(tz=datetime.timezone.utc).replace(tzinfo=None).isoformat(),
+            }
+        return stream_obj
+    
+    def _process_event_value(self, event_value):
+        if 'messages' in event_value:
+            event_value['message'] = event_value['messages'][-1].to_json()
+            del event_value['messages']
+            self.update_events(lc_load(event_value['message']))     # !!!: json-message to obj-message → LangChainBetaWarning: The function `load` is in beta. It is actively being worked on, so the API may change.
+            
+        elif self._event_value_is_interrupt(event_value):
+            self.interrupt = self._event_value2interrupt(event_value)
+            self.update_events(self.interrupt)
+            
+        self.on_end_event(event_value)
         
-        def process_event_value(event_value):
-            if 'messages' in event_value:
-                event_value['message'] = event_value['messages'][-1].to_json()
-                del event_value['messages']
-                self.update_events(lc_load(event_value['message']))     # !!!: json-message to obj-message → LangChainBetaWarning: The function `load` is in beta. It is actively being worked on, so the API may change.
-                
-            elif self._event_value_is_interrupt(event_value):
-                self.interrupt = self._event_value2interrupt(event_value)
-                self.update_events(self.interrupt)
+
+    def user_prompt(
+        self,
+        prompt: str,
+        state_updates: dict = dict(),
+    ):
+        with self._prompt_lock:
+            stream_prompt = self._build_stream_input(prompt, state_updates)
+            try:
+                yield self.conversation_handler.get_new_events
                 
-            self.on_end_event(event_value)
-            
-                     
-        stream_prompt = build_stream()
-        yield self.conversation_handler.get_new_events
+                stream = self.G.stream(
+                    input = stream_prompt,
+                    config = self.config,
+                    stream_mode = 'updates'
+                )
+                while True:
+                    # DOC: the slot is held only while the graph computes the next step, never while the consumer holds the yielded events
+                    with _LLM_SEMAPHORE:
+                        event = next(stream, None)
+                    if event is None:
+                        break
+                    self._graph_state = None
+                    for event_value in event.values():
+                        if event_value is not None:
+                            self._process_event_value(event_value)    
+                            yield self.conversation_handler.get_new_events
+                            
+                self.on_end_event(stream_prompt) # ???: maybe it should be called before G.stream()
+            finally:
+                self._graph_state = None
+                self.flush_layer_registry()     # DOC: also when the client stops consuming the stream
         
-        for event in self.G.stream(
-            input = stream_prompt,
-            config = self.config,
-            stream_mode = 'updates'
-        ):
-            for event_value in event.values():
-                if event_value is not None:
-                    process_event_value(event_value)    
-                    yield self.conversation_handler.get_new_events
-                    
-        self.on_end_event(stream_prompt) # ???: maybe it should be called before G.stream()
     
 
-    
 
 class GraphRegistry:
 
     """Registry for the agent graph."""
     
-    def __init__(self):
-        self.graphs = dict()
+    # DOC: Bounded by number of sessions and idle time → long running servers don't keep every GraphInterface ever opened in memory.
+    #      Only the interface is dropped: the graph checkpoints of an evicted thread stay in the checkpointer, so registering it again resumes its graph state
+    def __init__(
+        self,
+        maxsize: int = int(os.getenv('MAX_SESSIONS', '1024')),
+        ttl: float = float(os.getenv('SESSION_TTL', '3600')),
+    ):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.graphs: OrderedDict[str, GraphInterface] = OrderedDict()
+        self._last_access: dict[str, float] = dict()
+        self._lock = threading.Lock()
+        
+    def _pop_expired(self) -> list[GraphInterface]:
+        """Remove the sessions over size / idle limits (called with the lock held), sessions with a running prompt are kept and touched."""
+        now = time.monotonic()
+        evicted = []
+        for _ in range(len(self.graphs)):
+            thread_id = next(iter(self.graphs))
+            if len(self.graphs) <= self.maxsize and now - self._last_access[thread_id] < self.ttl:
+                break
+            if self.graphs[thread_id]._prompt_lock.locked():
+                self.graphs.move_to_end(thread_id)
+                self._last_access[thread_id] = now
+                continue
+            evicted.append(self.graphs.pop(thread_id))
+            del self._last_access[thread_id]
+        return evicted
+    
+    # DOC: Runs outside the registry lock → the S3 upload of one evicted session doesn't block the requests of the others
+    def _close_evicted(self, evicted: list[GraphInterface]):
+        for gi in evicted:
+            try:
+                gi.flush_layer_registry()
+            except Exception as e:
+                print(f"Failed to flush layer registry of thread {gi.thread_id}: {e}")
 
     def register(self, thread_id: str, user_id: str, **gi_kwargs) -> GraphInterface:
-        self.graphs[thread_id] = GraphInterface(thread_id, user_id, **gi_kwargs)
-        return self.graphs[thread_id]
+        gi = GraphInterface(thread_id, user_id, **gi_kwargs)
+        with self._lock:
+            self.graphs[thread_id] = gi
+            self.graphs.move_to_end(thread_id)
+            self._last_access[thread_id] = time.monotonic()
+            evicted = self._pop_expired()
+        self._close_evicted(evicted)
+        return gi
 
     def get(self, thread_id: str) -> GraphInterface:
-        return self.graphs.get(thread_id, None)
\ No newline at end of file
+        with self._lock:
+            evicted = self._pop_expired()
+            gi = self.graphs.get(thread_id, None)
+            if gi is not None:
+                self.graphs.move_to_end(thread_id)
+                self._last_access[thread_id] = time.monotonic()
+        self._close_evicted(evicted)
+        return gi
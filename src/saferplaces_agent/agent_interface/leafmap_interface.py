@@ -1,4 +1,5 @@
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 
 import geopandas as gpd
 
@@ -65,29 +66,63 @@ class LeafmapInterface():
         return True
         
         
-    def add_vector_layer(self, src, **kwargs):
-        """Add a vector layer to the map."""
+    def add_layers(self, layers: list[dict]):
+        """Add many layers at once, preparing their sources concurrently.
+        
+        Each item is a dict with `src`, `layer_type` and the optional add_layer kwargs.
+        Sources are fetched / converted in parallel threads (pure I/O), then layers are added to the map in order.
+        """
+        
+        layers = [ layer for layer in layers if layer['src'] not in self.registred_layers ]
+        if len(layers) == 0:
+            return False
+        
+        for layer in layers:
+            if layer['layer_type'] not in ('vector', 'raster'):
+                raise ValueError(f'Layer type {layer["layer_type"]} is not supported. Valid layer types are ["vector", "raster"]')
         
-        src = utils.s3uri_to_https(src)
-        name = kwargs.pop('title', utils.juststem(src))
+        def prepare(layer):
+            if layer['layer_type'] == 'vector':
+                return self._prepare_vector_layer(layer['src'])
+            return self._prepare_raster_layer(layer['src'])
         
+        with ThreadPoolExecutor(max_workers=min(8, len(layers))) as executor:
+            prepared = list(executor.map(prepare, layers))
+        
+        for layer, prepared_src in zip(layers, prepared):
+            kwargs = { k: v for k, v in layer.items() if k not in ('src', 'layer_type') }
+            if layer['layer_type'] == 'vector':
+                self._add_prepared_vector_layer(layer['src'], prepared_src, **kwargs)
+            else:
+                self._add_prepared_raster_layer(prepared_src, **kwargs)
+            self.registred_layers.append(layer['src'])
+        return True
+        
+        
+    def _prepare_vector_layer(self, src):
         # DOC: when using vector layers in MapLibreGL they needs to be in EPSG:4326
-        gdf = gpd.read_file(src)
+        gdf = gpd.read_file(utils.s3uri_to_https(src))
         if gdf.crs.to_epsg() != 4326:
             gdf = gdf.to_crs(epsg=4326)
-        
+        return gdf
+    
+    def _add_prepared_vector_layer(self, src, gdf, **kwargs):
+        name = kwargs.pop('title', utils.juststem(utils.s3uri_to_https(src)))
         self.m.add_gdf(
             gdf = gdf,
             name = name
         )
         
+    def add_vector_layer(self, src, **kwargs):
+        """Add a vector layer to the map."""
+        self._add_prepared_vector_layer(src, self._prepare_vector_layer(src), **kwargs)
         
-    def add_raster_layer(self, src, **kwargs):
-        """Add a raster layer to the map."""
         
+    def _prepare_raster_layer(self, src):
         src_cog = utils.tif_to_cog3857(src)
-        
-        src_cog = utils.s3uri_to_https(src_cog)
+        return utils.s3uri_to_https(src_cog)
+    
+    def _add_prepared_raster_layer(self, src_cog, **kwargs):
         name = kwargs.pop('title', utils.juststem(src_cog))
         colormap = kwargs.pop('colormap_name', 'blues')
         nodata = kwargs.pop('nodata', -9999)
@@ -99,6 +134,10 @@ class LeafmapInterface():
             nodata = nodata,
         )
         
+    def add_raster_layer(self, src, **kwargs):
+        """Add a raster layer to the map."""
+        self._add_prepared_raster_layer(self._prepare_raster_layer(src), **kwargs)
+        
     
     def add_3d_buildings(self):
         self.m.add_overture_3d_buildings()
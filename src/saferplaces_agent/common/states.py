@@ -41,6 +41,10 @@ def src_layer_exists(graph_state: BaseGraphState, layer_src: str) -> bool:
     """Check if the layer exists in the graph state."""
     return any(layer.get('src') == layer_src for layer in graph_state.get('layer_registry', []))
 
+def layer_registry_srcs(graph_state: BaseGraphState) -> set[str]:
+    """Set of the layer sources in the graph state, for O(1) membership checks over many candidate layers."""
+    return { layer.get('src') for layer in graph_state.get('layer_registry', []) }
+
 def new_layer_title(graph_state: BaseGraphState, base_title: str) -> str:
     layers = graph_state.get('layer_registry', [])
     base_title_layers = [layer for layer in layers if layer.get('title', '').startswith(base_title)]
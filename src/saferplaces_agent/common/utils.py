@@ -4,28 +4,39 @@ import os
 import sys
 import re
 import ast
+import atexit
 import uuid
+import types
 import math
-import base64
+import secrets
+import json
 import hashlib
 import datetime
+import functools
 import requests
+import requests.adapters
+from urllib3.util.retry import Retry
 import tempfile
 import textwrap
+import threading
 import urllib.parse
 
 import pyogrio
 import geopandas as gpd
 
 import rasterio
-from rasterio.io import MemoryFile
-from rasterio.warp import calculate_default_transform, reproject
+from rasterio.vrt import WarpedVRT
 from rasterio.enums import Resampling
 from rasterio.shutil import copy as rio_copy
 from rasterio.errors import RasterioIOError
 
 from typing import Sequence
 
+try:
+    import orjson     # DOC: optional, faster JSON (de)serialization for API payloads
+except ImportError:
+    orjson = None
+
 from langchain_openai import ChatOpenAI
 
 from langchain_core.messages import RemoveMessage, AIMessage, ToolMessage, ToolCall
@@ -44,9 +55,13 @@ os.makedirs(_temp_dir, exist_ok=True)
 def guid():
     return str(uuid.uuid4())
 
+def is_debug_mode():
+    # DOC: Debug flag forwarded to the SaferPlaces / SaferCast APIs, debug responses carry extra diagnostics → set SAFERPLACES_API_DEBUG=false to get lean responses
+    return os.getenv('SAFERPLACES_API_DEBUG', 'true').strip().lower() in ('1', 'true', 'yes', 'on')
+
 def b64uuid():
-    u = uuid.uuid4()
-    return base64.urlsafe_b64encode(u.bytes).rstrip(b'=').decode('ascii')
+    # DOC: 16 random bytes as unpadded url-safe base64 (22 chars), same shape as a base64-encoded uuid4
+    return secrets.token_urlsafe(16)
 
 def hash_string(s, hash_method=hashlib.md5):
     return hash_method(s.encode('utf-8')).hexdigest()
@@ -58,9 +73,14 @@ def s3uri_to_https(s3_uri):
     """
     if not s3_uri.startswith("s3://"):
         return s3_uri  # Already an HTTPS URL or invalid format
+    s3_region = os.getenv("AWS_REGION", "us-east-1")  # Default to us-east-1 if not set
+    return _s3uri_to_https(s3_uri, s3_region)
+
+# DOC: The same layer URIs are converted over and over (layer lists, renders, exports) → memoize, keyed by region too so an env change is honored
+@functools.lru_cache(maxsize=1024)
+def _s3uri_to_https(s3_uri, s3_region):
     # Rimuovi prefisso e separa bucket e key
     bucket, key = s3_utils.get_bucket_name_key(s3_uri)
-    s3_region = os.getenv("AWS_REGION", "us-east-1")  # Default to us-east-1 if not set
     # Encode della chiave
     encoded_key = urllib.parse.quote(key, safe="/")
     return f"https://s3.{s3_region}.amazonaws.com/{bucket}/{encoded_key}"
@@ -154,6 +174,17 @@ def ceil_decimals(number, decimals=0):
     factor = 10 ** decimals
     return math.ceil(number * factor) / factor
 
+def round_bbox(bbox, decimals=1):
+    """Round a [min_x, min_y, max_x, max_y] bbox outwards (floor mins, ceil maxs) to the given decimals."""
+    factor = 10 ** decimals
+    min_x, min_y, max_x, max_y = bbox
+    return [
+        math.floor(min_x * factor) / factor,
+        math.floor(min_y * factor) / factor,
+        math.ceil(max_x * factor) / factor,
+        math.ceil(max_y * factor) / factor,
+    ]
+
 
 def dedent(s: str, add_tab: int = 0, tab_first: bool = True) -> str:
     """Dedent a string by removing common leading whitespace."""
@@ -170,6 +201,10 @@ def dedent(s: str, add_tab: int = 0, tab_first: bool = True) -> str:
 
 # REGION: [Geospatial utils]
 
+# DOC: GDAL defaults for remote (/vsicurl/, /vsis3/) reads → no directory listing on open, block cache for range requests
+os.environ.setdefault("GDAL_DISABLE_READDIR_ON_OPEN", "EMPTY_DIR")
+os.environ.setdefault("VSI_CACHE", "TRUE")
+
 def get_geodataframe_crs(geo_df):
     epsg_code = geo_df.crs.to_epsg()
     if epsg_code is None:
@@ -182,6 +217,12 @@ def is_vector_4326(geo_df):
     return eps_string == 'EPSG:4326'
 
 def fast_is_vector_4326(src: str) -> bool:
+    # DOC: read only the layer metadata through GDAL virtual file systems, download the file only if that fails
+    p = "/vsicurl/"+src if src.startswith(("http://","https://")) else (s3uri_to_vsis3(src) if src.startswith("s3://") else src)
+    try:
+        return pyogrio.read_info(p)["crs"] == "EPSG:4326"
+    except Exception:
+        pass
     tmp = s3_utils.s3_download(s3https_to_s3uri(src), justfname(src))
     info = pyogrio.read_info(tmp)
     is_4326 = info["crs"] == "EPSG:4326"
@@ -236,14 +277,20 @@ def vector_to_geojson4326(src: str, dst: str = None, debug: bool = False) -> str
     return dst
     
 
+def _is_cog_dataset(ds) -> bool:
+    if ds.driver != "GTiff": return False
+    if (ds.tags(ns="IMAGE_STRUCTURE").get("LAYOUT","").upper() == "COG"): return True
+    tiled = ds.profile.get("tiled", False) or ds.tags(ns="IMAGE_STRUCTURE").get("TILED","").upper()=="YES"
+    return tiled and len(ds.overviews(1)) > 0
+
+def _is_3857_dataset(ds) -> bool:
+    return ds.crs is not None and ds.crs.to_epsg() == 3857
+
 def is_cog(src: str) -> bool:
     p = src if src.startswith(("/vsicurl/", "/vsis3/", "s3://")) else ("/vsicurl/"+src if src.startswith(("http://","https://")) else src)
     try:
         with rasterio.open(p) as ds:
-            if ds.driver != "GTiff": return False
-            if (ds.tags(ns="IMAGE_STRUCTURE").get("LAYOUT","").upper() == "COG"): return True
-            tiled = ds.profile.get("tiled", False) or ds.tags(ns="IMAGE_STRUCTURE").get("TILED","").upper()=="YES"
-            return tiled and len(ds.overviews(1)) > 0
+            return _is_cog_dataset(ds)
     except RasterioIOError:
         return False
 
@@ -257,7 +304,7 @@ def is_raster_3857(src: str) -> bool:
         # vsicurl_path = f"/vsicurl/{src}"
         try:
             with rasterio.open(src) as ds:
-                return ds.crs is not None and ds.crs.to_epsg() == 3857
+                return _is_3857_dataset(ds)
         except Exception:
             # fallback: scarica temporaneamente il file
             with tempfile.NamedTemporaryFile(suffix=".tif", delete=True) as tmp:
@@ -267,7 +314,7 @@ def is_raster_3857(src: str) -> bool:
                 tmp.flush()
                 try:
                     with rasterio.open(tmp.name) as ds:
-                        return ds.crs is not None and ds.crs.to_epsg() == 3857
+                        return _is_3857_dataset(ds)
                 except Exception:
                     return False
     else:
@@ -276,14 +323,24 @@ def is_raster_3857(src: str) -> bool:
             raise FileNotFoundError(f"File non trovato: {src}")
         try:
             with rasterio.open(src) as ds:
-                return ds.crs is not None and ds.crs.to_epsg() == 3857
+                return _is_3857_dataset(ds)
         except Exception:
             return False
     
+def _raster_header(src: str) -> tuple[bool, bool, str | None]:
+    p = src if src.startswith(("/vsicurl/", "/vsis3/", "s3://")) else ("/vsicurl/"+src if src.startswith(("http://","https://")) else src)
+    try:
+        with rasterio.open(p) as ds:
+            return _is_3857_dataset(ds), _is_cog_dataset(ds), ds.dtypes[0]
+    except Exception:
+        # DOC: same broad fallback as is_raster_3857 (download + reopen), treated as non-COG
+        return is_raster_3857(src), False, None
+
 def tif_to_cog3857(src: str, dst: str = None, debug: bool = False, **kwargs) -> str:
     # DOC: if src is already a COG in EPSG:3857, return it
-    do_reproject = not is_raster_3857(src)
-    do_cog = do_reproject or not is_cog(src)
+    is_3857, is_cog_src, src_dtype = _raster_header(src)
+    do_reproject = not is_3857
+    do_cog = do_reproject or not is_cog_src
     if not any([do_reproject, do_cog]):
         return src
 
@@ -314,6 +371,9 @@ def tif_to_cog3857(src: str, dst: str = None, debug: bool = False, **kwargs) ->
     if debug:
         print(f"tif_to_cog: Converting {src} to COG at {dst}")
 
+    # DOC: floating point rasters (e.g. DEMs) compress much better with the floating point predictor (lossless)
+    default_predictor = "3" if src_dtype is not None and src_dtype.startswith("float") else "2"
+
     def to_cog(src, dst, **kwargs):
         """Run the COG conversion."""
         rio_copy(
@@ -321,8 +381,8 @@ def tif_to_cog3857(src: str, dst: str = None, debug: bool = False, **kwargs) ->
             dst,
             driver="COG",
             COMPRESS=kwargs.get("COMPRESS", "DEFLATE"),
-            PREDICTOR=kwargs.get("PREDICTOR", "2"),           # 2 per continui, 3 per RGB
-            BLOCKSIZE=kwargs.get("BLOCKSIZE", "256"),
+            PREDICTOR=kwargs.get("PREDICTOR", default_predictor),     # 2 per interi, 3 per float
+            BLOCKSIZE=kwargs.get("BLOCKSIZE", "512"),          # larger tiles → fewer range requests per viewport
             BIGTIFF=kwargs.get("BIGTIFF", "IF_SAFER"),
             NUM_THREADS=kwargs.get("NUM_THREADS", "ALL_CPUS"),
             OVERVIEWS=kwargs.get("OVERVIEWS", "IGNORE_EXISTING"),
@@ -333,43 +393,9 @@ def tif_to_cog3857(src: str, dst: str = None, debug: bool = False, **kwargs) ->
         dst_crs = "EPSG:3857"
         src_rio = src if src.startswith(("/vsicurl/", "/vsis3/", "s3://")) else ("/vsicurl/"+src if src.startswith(("http://","https://")) else src)
         print(f"tif_to_cog: Reprojecting {src_rio} to {dst_crs}")
-        with rasterio.open(src_rio) as src_ds:
-            transform, width, height = calculate_default_transform(
-                src_ds.crs, dst_crs, src_ds.width, src_ds.height, *src_ds.bounds
-            )
-            kwargs = src_ds.meta.copy()
-            kwargs.update({
-                "crs": dst_crs,
-                "transform": transform,
-                "width": width,
-                "height": height
-            })
-            with MemoryFile() as memfile:
-                with memfile.open(**kwargs) as dst_ds:
-                    for i in range(1, src_ds.count + 1):
-                        reproject(
-                            source=rasterio.band(src_ds, i),
-                            destination=rasterio.band(dst_ds, i),
-                            src_transform=src_ds.transform,
-                            src_crs=src_ds.crs,
-                            dst_transform=transform,
-                            dst_crs=dst_crs,
-                            resampling=Resampling.average
-                        )
-                # DOC: run cog conversion
-                # rio_copy(
-                #     memfile.name,
-                #     dst if not use_tmp_dst else dst_local,
-                #     driver="COG",
-                #     COMPRESS=kwargs.get("COMPRESS", "DEFLATE"),
-                #     PREDICTOR=kwargs.get("PREDICTOR", "2"),           # 2 per continui, 3 per RGB
-                #     BLOCKSIZE=kwargs.get("BLOCKSIZE", "256"),
-                #     BIGTIFF=kwargs.get("BIGTIFF", "IF_SAFER"),
-                #     NUM_THREADS=kwargs.get("NUM_THREADS", "ALL_CPUS"),
-                #     OVERVIEWS=kwargs.get("OVERVIEWS", "IGNORE_EXISTING"),
-                #     RESAMPLING=kwargs.get("RESAMPLING", "AVERAGE")     # stringa, non enum
-                # )
-                to_cog(memfile.name, dst if not use_tmp_dst else dst_local, **kwargs)
+        # DOC: warp through a VRT so pixels are reprojected block by block while the COG is written, without materializing an intermediate raster
+        with rasterio.open(src_rio) as src_ds, WarpedVRT(src_ds, crs=dst_crs, resampling=Resampling.average) as vrt_ds:
+            to_cog(vrt_ds, dst if not use_tmp_dst else dst_local, **kwargs)
     
     elif do_cog:
         # DOC: run cog conversion
@@ -402,6 +428,54 @@ def tif_to_cog3857(src: str, dst: str = None, debug: bool = False, **kwargs) ->
 
 
 
+# REGION: [HTTP utils]
+
+# DOC: Shared keep-alive session → TCP/TLS connections to the SaferPlaces / SaferCast APIs are reused across tool calls
+_http_session = requests.Session()
+# DOC: POSTs to /processes/*/execution start long running, non idempotent jobs → retry only failed connects (nothing was sent) and 503 (service refused the request).
+#      Read errors, 502 and 504 are never retried: the upstream may already have accepted the job and a retry would submit it twice
+_http_retry = Retry(total=2, connect=2, read=0, status=2, status_forcelist=(503,), allowed_methods=None, backoff_factor=0.25, raise_on_status=False)
+_http_adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=_http_retry)
+_http_session.mount('http://', _http_adapter)
+_http_session.mount('https://', _http_adapter)
+# DOC: Release the pooled sockets on interpreter shutdown instead of leaving them to the GC
+atexit.register(_http_session.close)
+
+# DOC: (connect, read) → fail fast on unreachable hosts, no read limit since API processes can run for minutes
+_HTTP_TIMEOUT = (10, None)
+
+def post_json(url: str, payload: dict, **kwargs) -> requests.Response:
+    """POST a JSON payload serialized once, in compact form, as the request body."""
+    if orjson is not None:
+        body = orjson.dumps(payload)
+    else:
+        body = json.dumps(payload, separators=(',', ':'), allow_nan=False).encode('utf-8')
+    headers = { 'Content-Type': 'application/json', **kwargs.pop('headers', dict()) }
+    kwargs.setdefault('timeout', _HTTP_TIMEOUT)
+    return _http_session.post(url, data=body, headers=headers, **kwargs)
+
+# DOC: Settings of a SaferPlaces API process read from the environment once; call saferplaces_api_env.cache_clear() after changing os.environ at runtime
+@functools.lru_cache(maxsize=None)
+def saferplaces_api_env(process: str) -> types.SimpleNamespace:
+    """Return api_root, api_url, api_user and api_token of the given SaferPlaces API process (e.g. 'safer-rain-process')."""
+    api_root = os.getenv('SAFERPLACES_API_ROOT', 'http://localhost:5000')
+    return types.SimpleNamespace(
+        api_root = api_root,
+        api_url = f"{api_root}/processes/{process}/execution",
+        api_user = os.getenv("SAFERPLACES_API_USER"),
+        api_token = os.getenv("SAFERPLACES_API_TOKEN"),
+    )
+
+def response_json(response: requests.Response):
+    """Decode a JSON response straight from its body bytes (no charset detection, no intermediate str)."""
+    if orjson is not None:
+        return orjson.loads(response.content)
+    return json.loads(response.content)
+
+# ENDREGION: [HTTP utils]
+
+
+
 # REGION: [Disable arnings]
 
 def disable_warnings():
@@ -457,6 +531,75 @@ def ask_llm(role, message, llm=_base_llm, eval_output=False):
     return llm_out.content
 
 
+# DOC: Location name → bbox cache, persisted across runs so a place is geocoded by the LLM only once
+_geocode_cache_file = os.path.join(os.path.expanduser('~'), '.cache', 'saferplaces', 'geocode.json')
+_geocode_cache = None
+_geocode_cache_lock = threading.Lock()
+
+def _load_geocode_cache() -> dict:
+    global _geocode_cache
+    if _geocode_cache is None:
+        try:
+            with open(_geocode_cache_file, 'r') as f:
+                _geocode_cache = json.load(f)
+        except (OSError, ValueError):
+            _geocode_cache = dict()
+    return _geocode_cache
+
+def _save_geocode_cache(cache: dict):
+    try:
+        os.makedirs(os.path.dirname(_geocode_cache_file), exist_ok=True)
+        tmp_file = f'{_geocode_cache_file}.{os.getpid()}.tmp'
+        with open(tmp_file, 'w') as f:
+            json.dump(cache, f)
+        os.replace(tmp_file, _geocode_cache_file)
+    except OSError:
+        pass
+
+def location_name_to_bbox(location_name: str, llm=_base_llm) -> list[float] | str:
+    """Get the [min_x, min_y, max_x, max_y] EPSG:4326 bounding box of a location name, asking the LLM only on cache miss."""
+    key = location_name.strip().lower()
+    with _geocode_cache_lock:
+        bbox = _load_geocode_cache().get(key)
+    if bbox is not None:
+        return list(bbox)
+    bbox = ask_llm(
+        role = 'system',
+        message = f"""Please provide the bounding box coordinates for the area: {location_name} with format [min_x, min_y, max_x, max_y] in EPSG:4326 Coordinate Reference System. 
+        Provide only the coordinates list without any additional text or explanation.""",
+        llm = llm,
+        eval_output = True
+    )
+    # DOC: cache only well-formed answers (4 numbers, finite, ordered and within WGS84 ranges)
+    if _is_valid_bbox(bbox):
+        bbox = list(bbox)
+        with _geocode_cache_lock:
+            cache = _load_geocode_cache()
+            cache[key] = bbox
+            _save_geocode_cache(cache)
+    return bbox
+
+def _is_valid_bbox(bbox) -> bool:
+    from ..nodes.base.base_models import BBox     # DOC: lazy → nodes import this module
+    if not isinstance(bbox, (list, tuple)) or len(bbox) != 4:
+        return False
+    if not all(isinstance(c, (int, float)) and not isinstance(c, bool) and math.isfinite(c) for c in bbox):
+        return False
+    try:
+        BBox(west=bbox[0], south=bbox[1], east=bbox[2], north=bbox[3])
+    except ValueError:
+        return False
+    return True
+
+def forget_location_bbox(location_name: str):
+    """Drop a cached location bbox (e.g. when the user did not confirm it), so the next request asks the LLM again."""
+    key = location_name.strip().lower()
+    with _geocode_cache_lock:
+        cache = _load_geocode_cache()
+        if cache.pop(key, None) is not None:
+            _save_geocode_cache(cache)
+
+
 def map_action_new_layer(layer_name, layer_src, layer_styles=[]):
     """Create a map action with the given type and data."""
     layer_styles = { 'styles': layer_styles } if len(layer_styles) > 0 else dict()
@@ -1,5 +1,8 @@
+import functools
+
 from typing import Optional
 from typing_extensions import Annotated
+from pydantic import AliasChoices
 from langgraph.prebuilt import InjectedState
 from langchain_core.tools import BaseTool
 from langchain_core.tools.base import ArgsSchema
@@ -11,6 +14,22 @@ from langchain_core.callbacks import (
 from . import BaseToolInterrupt
 
 
+# DOC: Required fields of an args_schema, resolved once per schema class instead of on every tool call
+@functools.lru_cache(maxsize=None)
+def _schema_required_args(args_schema) -> tuple[str, ...]:
+    return tuple(arg for arg, schema in args_schema.model_fields.items() if schema.is_required())
+
+
+# DOC: Alias → field name of an args_schema (from the fields' AliasChoices), resolved once per schema class
+@functools.lru_cache(maxsize=None)
+def _schema_arg_aliases(args_schema) -> dict[str, str]:
+    arg_aliases = dict()
+    for arg, schema in args_schema.model_fields.items():
+        if isinstance(schema.validation_alias, AliasChoices):
+            arg_aliases.update({ alias: arg for alias in schema.validation_alias.choices if isinstance(alias, str) and alias != arg })
+    return arg_aliases
+
+
 # DOC: This is a base agent tool that exploit ToolInterrupt for human-in-the-loop paradigm
 class BaseAgentTool(BaseTool):
     
@@ -34,6 +53,19 @@ class BaseAgentTool(BaseTool):
         self.args_schema = args_schema
         
     
+    # DOC: Rename aliased args to their field name with a single dict pass before validation → BaseTool only keeps the validated args whose field name is in the input, so aliased values would be dropped
+    def _parse_input(self, tool_input, *args, **kwargs):
+        if isinstance(tool_input, dict) and self.args_schema is not None:
+            arg_aliases = _schema_arg_aliases(self.args_schema)
+            if arg_aliases:
+                tool_input = {
+                    arg_aliases.get(arg, arg): value
+                    for arg, value in tool_input.items()
+                    if arg not in arg_aliases or arg_aliases[arg] not in tool_input     # DOC: the field name wins over its aliases
+                }
+        return super()._parse_input(tool_input, *args, **kwargs)
+    
+    
     def tool_decription(self):
         def args_description(args_schema):
             args_description = '\n'.join([
@@ -51,7 +83,7 @@ class BaseAgentTool(BaseTool):
         
     # DOC: Check missing arguments based on the args_schema (if Deafult is None than it's not required)
     def check_required_args(self, tool_args):
-        missing_args = [arg for arg, schema in self.args_schema.model_fields.items() if schema.is_required() and tool_args[arg] is None]
+        missing_args = [arg for arg in _schema_required_args(self.args_schema) if tool_args.get(arg) is None]
         
         if len(missing_args) > 0:
             self.execution_confirmed = False
@@ -68,9 +100,14 @@ class BaseAgentTool(BaseTool):
     # DOC: Check invalid arguments based on a list of function related to each argument { argname: [ test(**tool_args) -> Invalid-Reason else None" , ... ], ... }
     def _set_args_validation_rules(self):
         return { arg: [] for arg in self.args_schema.model_fields.keys() }
+    
+    # DOC: Rules only read the tool args (and self) when they are called → build them once per tool instance
+    @functools.cached_property
+    def args_validation_rules(self):
+        return self._set_args_validation_rules()
             
     def check_validation_rules(self, tool_args):
-        args_validation_rules = self._set_args_validation_rules()
+        args_validation_rules = self.args_validation_rules
         
         invalid_args = dict()
         
@@ -98,9 +135,12 @@ class BaseAgentTool(BaseTool):
     def _set_args_inference_rules(self):
         return { arg: None for arg in self.args_schema.model_fields.keys() }
     
+    @functools.cached_property
+    def args_inference_rules(self):
+        return self._set_args_inference_rules()
+    
     def infer_args(self, tool_args):
-        original_tool_args = tool_args.copy()
-        args_inference_rules = self._set_args_inference_rules()
+        args_inference_rules = self.args_inference_rules
         for arg in self.args_schema.model_fields.keys():
             if arg in args_inference_rules and args_inference_rules[arg] is not None:
                 infer_arg = args_inference_rules[arg](**tool_args)
@@ -140,20 +180,30 @@ class BaseAgentTool(BaseTool):
         return None
     
     
+    # DOC: Called when the user does not confirm the args (tool_args are the ones of the tool call, before inference) → drop what was inferred from them
+    def _on_args_not_confirmed(self, tool_args):
+        pass
+    
+    
     # DOC: Back to a consisent state
     def _on_tool_end(self):
         self.execution_confirmed = False
         self.output_confirmed = False
                 
     
-    # DOC: Run tool with the given arguments, this function should be overridden by the user that will call super() to do args validation and confirmation
+    # DOC: Run tool with the given arguments → Will check required, validity and inference over arguments than call and return _execute()
+    # DOC: Schema args come either as keyword arguments (as passed by LangChain, no override needed) or packed in `tool_args` by subclasses overriding _run with explicit parameters
     def _run(
-        self, 
+        self,
         tool_args: dict = None,
-        run_manager: None | Optional[CallbackManagerForToolRun] = None
+        run_manager: None | Optional[CallbackManagerForToolRun] = None,
+        **kwargs
     ) -> dict:
         """Run the tool with the given arguments."""
-        
+
+        if tool_args is None:
+            tool_args = kwargs
+
         def controls_before_execution(tool_args):
             self.check_required_args(tool_args)         # 1. Required arguments
             self.check_validation_rules(tool_args)      # 2. Invalid arguments
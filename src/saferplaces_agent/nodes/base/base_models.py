@@ -1,5 +1,5 @@
 from typing import Optional, Union, List, Dict, Any, Literal
-from pydantic import BaseModel, Field, AliasChoices, field_validator, model_validator
+from pydantic import BaseModel, ConfigDict, Field, AliasChoices, field_validator, model_validator
 
 
 
@@ -11,11 +11,34 @@ class BBox(BaseModel):
     - `east` = max longitude
     - `north` = max latitude
     """
+    # DOC: Immutable → hashable, so a bbox can key caches of per-AOI results
+    model_config = ConfigDict(frozen=True)
+
     west: float = Field(..., description="Minimum longitude (degrees), e.g., 10.0")
     south: float = Field(..., description="Minimum latitude (degrees), e.g., 44.0")
     east: float = Field(..., description="Maximum longitude (degrees), e.g., 12.0")
     north: float = Field(..., description="Maximum latitude (degrees), e.g., 46.0")
 
+    @model_validator(mode='before')
+    @classmethod
+    def from_list(cls, data: Any) -> Any:
+        """
+        Accept a plain [west, south, east, north] sequence as well as a mapping.
+        """
+        if isinstance(data, (list, tuple)) and len(data) == 4:
+            west, south, east, north = data
+            return {'west': west, 'south': south, 'east': east, 'north': north}
+        return data
+
+    @model_validator(mode='after')
+    def check_bounds(self) -> 'BBox':
+        """
+        Check ordering and WGS84 ranges of the four bounds in a single pass.
+        """
+        if not (-180 <= self.west < self.east <= 180 and -90 <= self.south < self.north <= 90):
+            raise ValueError(f"Invalid bounding box {self}: expected -180 <= west < east <= 180 and -90 <= south < north <= 90.")
+        return self
+
     def __str__(self):
         return f"{{\"west\": {self.west}, \"south\": {self.south}, \"east\": {self.east}, \"north\": {self.north}}}"
     
@@ -18,7 +18,7 @@ class BaseToolHandlerNodeCallback():
     def __call__(self, **kwargs):
         """Call the callback function with the provided arguments."""
         if self.callback is not None:
-            return self.callback(**(self.callback_args | kwargs))
+            return self.callback(**{**self.callback_args, **kwargs})     # DOC: call kwargs win over the stored callback_args
         else:
             return
         
@@ -102,13 +102,18 @@ class BaseToolHandlerNode:
                 "name": tool_call['name'], 
                 "content": result,
                 "tool_call_id": tool_call['id'],
+                "artifact": result.get('tool_response', result) if isinstance(result, dict) else result,     # DOC: ToolMessage stringifies dict content → keep the structured tool response (not the state updates) for the renderers
             }
             
             tool_result_updates = result.get('updates', dict()) if isinstance(result, dict) else dict()
             
             callback_result = self.on_handle_end_callback(**{'tool_output': result})  # DOC: Call the on_handle_end function if provided
             
-            additional_updates = self.additional_ouput_state | tool_result_updates | callback_result.get('update', dict())   # TODO: correct with 'updates'
+            additional_updates = {
+                **self.additional_ouput_state,
+                **tool_result_updates,
+                **callback_result.get('update', dict()),   # TODO: correct with 'updates'
+            }
             additional_updates_messages = additional_updates.pop('messages', [])
 
             next_node = callback_result.get('next_node', None)
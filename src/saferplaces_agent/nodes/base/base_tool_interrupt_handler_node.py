@@ -267,6 +267,7 @@ class BaseToolInterruptArgsConfirmationHandler(BaseToolInterruptHandler):
                 'update': { "messages": [self.tool_message] }
             }
         elif provided_args is False:
+            self.tool._on_args_not_confirmed(self.tool_message.tool_calls[-1]['args'])
             remove_tool_message = RemoveMessage(self.tool_message.id)
             system_message = SystemMessage(content=f"User choose to update it's original request with this additional informations: {response}")
             return {
@@ -277,6 +278,7 @@ class BaseToolInterruptArgsConfirmationHandler(BaseToolInterruptHandler):
                 }
             }
         else:
+            self.tool._on_args_not_confirmed(self.tool_message.tool_calls[-1]['args'])
             remove_tool_message = RemoveMessage(self.tool_message.id)
             system_message = SystemMessage(content=f"User choose to exit the tool process with this response: {response}")            
             return {
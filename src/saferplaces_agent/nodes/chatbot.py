@@ -1,5 +1,6 @@
 # DOC: Chatbot node and router
 
+import functools
 from typing_extensions import Literal
 
 from langgraph.graph import END
@@ -52,17 +53,21 @@ tools_map[N.GEOSPATIAL_OPS_TOOL] = GeospatialOpsTool()
 
 tool_node = ToolNode([tool for tool in tools_map.values()])
 
-llm_with_tools = utils._base_llm.bind_tools([tool for tool in tools_map.values()])
+# DOC: bind_tools() converts every tool args_schema to its JSON schema → bind each tool selection once and reuse the runnable across turns
+@functools.lru_cache(maxsize=32)
+def _bind_tools(tool_names: tuple[str, ...]) -> Runnable[LanguageModelInput, BaseMessage]:
+    return utils._base_llm.bind_tools([tools_map[tool_name] for tool_name in tool_names if tool_name in tools_map])
+
+llm_with_tools = _bind_tools(tuple(tools_map.keys()))
 
 
 def set_tool_choice(tool_choice: list[str] | None = None) -> Runnable[LanguageModelInput, BaseMessage]:
     if tool_choice is None:
-        llm_with_tools = utils._base_llm.bind_tools([])
+        llm_with_tools = _bind_tools(tuple())
     elif len(tool_choice) == 0:
-        llm_with_tools = utils._base_llm.bind_tools([tool for tool in tools_map.values()])
+        llm_with_tools = _bind_tools(tuple(tools_map.keys()))
     else:
-        tool_choice = [tools_map[tool_name] for tool_name in tool_choice if tool_name in tools_map]
-        llm_with_tools = utils._base_llm.bind_tools(tool_choice)
+        llm_with_tools = _bind_tools(tuple(tool_choice))
     return llm_with_tools
 
 
@@ -105,23 +105,12 @@ class CreateProjectSelectDTMTool(BaseAgentTool):
         def infer_area(**ka):
             def bounding_box_from_location_name(area):
                 if type(area) is str:
-                    area = utils.ask_llm(
-                        role = 'system',
-                        message = f"""Please provide the bounding box coordinates for the area: {area} with format [min_x, min_y, max_x, max_y] in EPSG:4326 Coordinate Reference System. 
-                        Provide only the coordinates list without any additional text or explanation.""",
-                        eval_output = True
-                    )
+                    area = utils.location_name_to_bbox(area)
                     self.execution_confirmed = False
                 return area
             def round_bounding_box(area):
                 if type(area) is list:
-                    precision = 1
-                    area = [
-                        utils.floor_decimals(area[0], precision),
-                        utils.floor_decimals(area[1], precision),
-                        utils.ceil_decimals(area[2], precision),
-                        utils.ceil_decimals(area[3], precision)
-                    ]
+                    area = utils.round_bbox(area, decimals=1)
                 return area
             area = bounding_box_from_location_name(ka['area'])
             area = round_bounding_box(area)
@@ -133,6 +122,12 @@ class CreateProjectSelectDTMTool(BaseAgentTool):
         }
         
     
+    # DOC: A location bbox the user did not confirm must not be served again from the geocode cache
+    def _on_args_not_confirmed(self, tool_args):
+        if type(tool_args.get('area')) is str:
+            utils.forget_location_bbox(tool_args['area'])
+        
+    
     # DOC: Execute the tool → Build notebook, write it to a file and return the path to the notebook and the zarr output file
     def _execute(
         self,
@@ -10,13 +10,9 @@ import requests
 import contextlib
 
 from typing import Optional, Union, List, Dict, Any, Literal
-from pydantic import BaseModel, Field, AliasChoices, field_validator, model_validator, validator
+from pydantic import BaseModel, Field, AliasChoices, field_validator, model_validator
 
 from langchain_core.messages import SystemMessage
-from langchain_core.callbacks import (
-    AsyncCallbackManagerForToolRun,
-    CallbackManagerForToolRun,
-)
 
 from ....common import utils, s3_utils
 from ....common import states as GraphStates
@@ -76,7 +72,8 @@ class GeospatialOpsInputSchema(BaseModel):
         description="Optional CRS to enforce on outputs (e.g., 'EPSG:4326').",
     )
 
-    @validator("output_file")
+    @field_validator("output_file")
+    @classmethod
     def _validate_filename(cls, v):
         if v is None:
             return v
@@ -265,18 +262,3 @@ Generate the code now. Only code. No comments.
     def _on_tool_end(self):
         self.execution_confirmed = True
         self.output_confirmed = False
-
-    # DOC: Try running AgentTool → Will check required, validity and inference over arguments thatn call and return _execute()
-
-    def _run(
-        self,
-        /,
-        **kwargs: Any,  # dict[str, Any] = None,
-    ) -> dict:
-
-        run_manager: Optional[CallbackManagerForToolRun] = kwargs.pop(
-            "run_manager", None)
-        return super()._run(
-            tool_args=kwargs,
-            run_manager=run_manager
-        )
@@ -1,17 +1,13 @@
 import os
 import datetime
+from datetime import timezone
 from dateutil import relativedelta
 from enum import Enum
-import requests
 
 from typing import Optional, Union, List, Dict, Any, Literal
 from pydantic import BaseModel, Field, AliasChoices, field_validator, model_validator
 
 from langchain_core.messages import SystemMessage
-from langchain_core.callbacks import (
-    AsyncCallbackManagerForToolRun,
-    CallbackManagerForToolRun,
-)
 
 from ....common import utils, s3_utils
 from ....common import states as GraphStates
@@ -19,11 +15,6 @@ from ....common import names as N
 from ....nodes.base import base_models, BaseAgentTool
 
 
-from typing import Optional, List, Literal
-from pydantic import BaseModel, Field, model_validator
-from datetime import timezone
-
-
 # ---- Product enum (allowed values) ----
 DPCProductCode = Literal[
     "VMI",          # Vertical Maximum Intensity (max reflectivity, dBZ) – ~5min
@@ -42,6 +33,7 @@ DPCProductCode = Literal[
     "CAPPI1", "CAPPI2", "CAPPI3", "CAPPI4", "CAPPI5", "CAPPI6", "CAPPI7", "CAPPI8"  # CAPPI reflectivity at fixed altitude (1–8 km) – ~10min
 ]
 DPCProductCodeValues = list(DPCProductCode.__args__)
+_DPC_PRODUCT_CODES = frozenset(DPCProductCodeValues)    # DOC: O(1) membership for the product validation rule
 
 DPCBoundingBox = {'west': 4.5233915, 'south': 35.0650858, 'east': 20.4766085, 'north': 47.8489892}  # DOC: DPC data bbox → (west, south, east, north) for Italy in EPSG:4326
 
@@ -97,12 +89,16 @@ class DPCRetrieverSchema(BaseModel):
     # ---- WHERE (fallback) ----
     lat_range: Optional[List[float]] = Field(
         default=None,
+        min_length=2,
+        max_length=2,
         title="Latitude Range (fallback)",
         description="Latitude range as [lat_min, lat_max] in EPSG:4326. Prefer using `bbox`.",
         examples=[[44.0, 46.0]],
     )
     long_range: Optional[List[float]] = Field(
         default=None,
+        min_length=2,
+        max_length=2,
         title="Longitude Range (fallback)",
         description="Longitude range as [lon_min, lon_max] in EPSG:4326. Prefer using `bbox`.",
         examples=[[10.0, 12.0]],
@@ -172,10 +168,10 @@ class DPCRetrieverSchema(BaseModel):
     def _normalize_and_validate(self):
         # Build bbox from lat/long ranges if not explicitly provided
         if self.bbox is None and self.lat_range and self.long_range:
-            if len(self.lat_range) == 2 and len(self.long_range) == 2:
-                lat_min, lat_max = self.lat_range
-                lon_min, lon_max = self.long_range
-                self.bbox = base_models.BBox(west=lon_min, south=lat_min, east=lon_max, north=lat_max)
+            # DOC: [min, max] shape enforced by the fields' min_length / max_length (a list schema with `items`, as required by the LLM tool-calling APIs)
+            lat_min, lat_max = self.lat_range
+            lon_min, lon_max = self.long_range
+            self.bbox = base_models.BBox(west=lon_min, south=lat_min, east=lon_max, north=lat_max)
 
         if self.bbox is None:
             raise ValueError("You must provide either `bbox` or both `lat_range` and `long_range`.")
@@ -261,7 +257,7 @@ class DPCRetrieverTool(BaseAgentTool):
         return {
             'product': [
                 lambda **ka: f"Invalid product name: {ka['product']}. It should be one of [{', '.join(DPCProductCodeValues)}]."
-                    if ka['product'] not in DPCProductCodeValues else None
+                    if ka['product'] not in _DPC_PRODUCT_CODES else None
             ],
             'bbox': [
                 lambda **ka: f"Invalid bbox: {ka['bbox']}. It should be inside the DPC bounding box {DPCBoundingBox}."
@@ -373,7 +369,7 @@ class DPCRetrieverTool(BaseAgentTool):
         }
         
         debug_args = {
-            'debug': kwargs.get('debug', True),     # TODO: use a global _is_debug_mode() to set this
+            'debug': kwargs.get('debug', utils.is_debug_mode()),
         }
         
         payload = {
@@ -385,7 +381,7 @@ class DPCRetrieverTool(BaseAgentTool):
         }
         
         # DOC: Call the DPC-Retriever API
-        api_response = requests.post(api_url, json=payload)
+        api_response = utils.post_json(api_url, payload)
         
         # DOC: If the api call fails, return an error response
         if api_response.status_code != 200:
@@ -396,7 +392,7 @@ class DPCRetrieverTool(BaseAgentTool):
             }
             
         # DOC: If the API call is successful, process the response 
-        api_response = api_response.json()
+        api_response = utils.response_json(api_response)
         if 'uri' in api_response:
             tool_response = {
                 'tool_response': api_response,
@@ -436,17 +432,3 @@ class DPCRetrieverTool(BaseAgentTool):
     def _on_tool_end(self):
         self.execution_confirmed = False
         self.output_confirmed = True
-        
-    
-    # DOC: Try running AgentTool → Will check required, validity and inference over arguments thatn call and return _execute()
-    def _run(
-        self, 
-        /,
-        **kwargs: Any, # dict[str, Any] = None,
-    ) -> dict:
-        
-        run_manager: Optional[CallbackManagerForToolRun] = kwargs.pop("run_manager", None)
-        return super()._run(
-            tool_args = kwargs,
-            run_manager = run_manager
-        )
\ No newline at end of file
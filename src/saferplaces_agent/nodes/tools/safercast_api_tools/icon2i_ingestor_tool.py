@@ -2,7 +2,6 @@ import os
 import datetime
 from dateutil import relativedelta
 from enum import Enum
-import requests
 
 from typing import Optional, Union, List, Dict, Any
 from pydantic import BaseModel, Field, AliasChoices, field_validator, model_validator
@@ -16,6 +15,7 @@ from ....common import utils, s3_utils
 from ....common import states as GraphStates
 from ....common import names as N
 from ....nodes.base import base_models, BaseAgentTool
+from .icon2i_retriever_tool import Variable
 
 
 class ICON2IIngestorSchema(BaseModel):
@@ -26,7 +26,7 @@ class ICON2IIngestorSchema(BaseModel):
     It includes fields for specifying the variable, latitude, forecast, and bucket destination.
     """
 
-    variable: str = Field(
+    variable: Variable = Field(
         ...,
         title="Variable",
         description='The variable to retrieve. Allowed values are "dewpoint_temperature", "pressure_reduced_to_msl", "snow_depth_water_equivalent", "temperature", "temperature_g", "total_cloud_cover", "total_precipitation", "u_wind_component", "v_wind_component".',
@@ -105,7 +105,7 @@ class ICON2IIngestorTool(BaseAgentTool):
 
     # DOC: Validation rules ( i.e.: valid init and lead time ... ) 
     def _set_args_validation_rules(self) -> dict:
-        # TODO: | forecast run in last 3-4 days | variable in allowed list |
+        # TODO: | forecast run in last 3-4 days |
         return dict()
     
 
@@ -135,19 +135,18 @@ class ICON2IIngestorTool(BaseAgentTool):
         # DOC: Call the SaferBuildings API ...
         api_url = f"{os.getenv('SAFERCAST_API_ROOT', 'http://localhost:5002')}/processes/icon2i-ingestor-process/execution"
         payload = { 
-            "inputs": kwargs | {
+            "inputs": {
+                **kwargs,               # DOC: This will include the args from the input schema
                 "token": os.getenv("SAFERCAST_API_TOKEN"),
                 "user": os.getenv("SAFERCAST_API_USER"),
-            } | {
-                "bucket_destination": f"{s3_utils._BASE_BUCKET}/icon2i-out"
-            } | {
-                "debug": True,  # TEST: enable debug mode
+                "bucket_destination": f"{s3_utils._BASE_BUCKET}/icon2i-out",
+                "debug": utils.is_debug_mode(),
             }
         }
         print(f"Executing {self.name} with args: {payload}")
-        response = requests.post(api_url, json=payload)
+        response = utils.post_json(api_url, payload)
         print(f"Response status code: {response.status_code} - {response.content}")
-        response = response.json() 
+        response = utils.response_json(response)
         # TODO: Check output_code ...
 
         # TEST: Simulate a response for testing purposes
@@ -171,17 +170,3 @@ class ICON2IIngestorTool(BaseAgentTool):
     def _on_tool_end(self):
         self.execution_confirmed = False
         self.output_confirmed = True
-        
-    
-    # DOC: Try running AgentTool → Will check required, validity and inference over arguments thatn call and return _execute()
-    def _run(
-        self, 
-        /,
-        **kwargs: Any, # dict[str, Any] = None,
-    ) -> dict:
-        
-        run_manager: Optional[CallbackManagerForToolRun] = kwargs.pop("run_manager", None)
-        return super()._run(
-            tool_args = kwargs,
-            run_manager = run_manager
-        )
\ No newline at end of file
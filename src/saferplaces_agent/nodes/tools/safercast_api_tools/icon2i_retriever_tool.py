@@ -2,16 +2,11 @@ import os
 import datetime
 from dateutil import relativedelta
 from enum import Enum
-import requests
 
 from typing import Optional, Union, List, Dict, Any, Literal
 from pydantic import BaseModel, Field, AliasChoices, field_validator, model_validator
 
 from langchain_core.messages import SystemMessage
-from langchain_core.callbacks import (
-    AsyncCallbackManagerForToolRun,
-    CallbackManagerForToolRun,
-)
 
 from ....common import utils, s3_utils
 from ....common import states as GraphStates
@@ -68,12 +63,16 @@ class ICON2IRetrieverSchema(BaseModel):
     # 🔁 Fallback/compat: range lat/lon come liste [min,max]
     lat_range: Optional[List[float]] = Field(
         default=None,
+        min_length=2,
+        max_length=2,
         title="Latitude Range (fallback)",
         description="Latitude range as [lat_min, lat_max] in EPSG:4326. Prefer `bbox`.",
         examples=[[44.0, 46.0]],
     )
     long_range: Optional[List[float]] = Field(
         default=None,
+        min_length=2,
+        max_length=2,
         title="Longitude Range (fallback)",
         description="Longitude range as [lon_min, lon_max] in EPSG:4326. Prefer `bbox`.",
         examples=[[10.0, 12.0]],
@@ -129,10 +128,10 @@ class ICON2IRetrieverSchema(BaseModel):
     def _normalize_and_validate(self):
         # --- bbox fallback from lat/long ranges ---
         if self.bbox is None and self.lat_range and self.long_range:
-            if len(self.lat_range) == 2 and len(self.long_range) == 2:
-                lat_min, lat_max = self.lat_range
-                lon_min, lon_max = self.long_range
-                self.bbox = base_models.BBox(west=lon_min, south=lat_min, east=lon_max, north=lat_max)
+            # DOC: [min, max] shape enforced by the fields' min_length / max_length (a list schema with `items`, as required by the LLM tool-calling APIs)
+            lat_min, lat_max = self.lat_range
+            lon_min, lon_max = self.long_range
+            self.bbox = base_models.BBox(west=lon_min, south=lat_min, east=lon_max, north=lat_max)
 
         # require at least some spatial constraint (optional: puoi renderlo obbligatorio)
         if self.bbox is None:
@@ -312,7 +311,7 @@ class ICON2IRetrieverTool(BaseAgentTool):
         }
         
         debug_args = {
-            'debug': kwargs.get('debug', True),     # TODO: use a global _is_debug_mode() to set this
+            'debug': kwargs.get('debug', utils.is_debug_mode()),
         }
         
         payload = {
@@ -324,7 +323,7 @@ class ICON2IRetrieverTool(BaseAgentTool):
         }
         
         # DOC: Call the DPC-Retriever API
-        api_response = requests.post(api_url, json=payload)
+        api_response = utils.post_json(api_url, payload)
         
         # DOC: If the api call fails, return an error response
         if api_response.status_code != 200:
@@ -335,7 +334,7 @@ class ICON2IRetrieverTool(BaseAgentTool):
             }
             
         # DOC: If the API call is successful, process the response 
-        api_response = api_response.json()
+        api_response = utils.response_json(api_response)
         if 'uri' in api_response:
             tool_response = {
                 'tool_response': api_response,
@@ -375,17 +374,3 @@ class ICON2IRetrieverTool(BaseAgentTool):
     def _on_tool_end(self):
         self.execution_confirmed = False
         self.output_confirmed = True
-        
-    
-    # DOC: Try running AgentTool → Will check required, validity and inference over arguments thatn call and return _execute()
-    def _run(
-        self, 
-        /,
-        **kwargs: Any, # dict[str, Any] = None,
-    ) -> dict:
-        
-        run_manager: Optional[CallbackManagerForToolRun] = kwargs.pop("run_manager", None)
-        return super()._run(
-            tool_args = kwargs,
-            run_manager = run_manager
-        )
\ No newline at end of file
@@ -1,18 +1,21 @@
-import os
-import datetime
-from dateutil import relativedelta
-from enum import Enum
-import requests
+import copy
+import json
+import math
+import time
+import functools
+import hashlib
+import operator
+import threading
+from types import MappingProxyType
+from collections import OrderedDict
 import numpy as np
+import shapely
+from shapely.geometry import Point, box
 
-from typing import Optional, Union, List, Dict, Any
-from pydantic import BaseModel, Field, AliasChoices, field_validator, model_validator
+from typing import Optional, Any
+from pydantic import BaseModel, ConfigDict, Field, AliasChoices
 
-from langchain_core.messages import SystemMessage, HumanMessage
-from langchain_core.callbacks import (
-    AsyncCallbackManagerForToolRun,
-    CallbackManagerForToolRun,
-)
+from langchain_core.messages import SystemMessage
 
 from ....common import utils, s3_utils
 from ....common import names as N
@@ -20,6 +23,137 @@ from ....common import states as GraphStates
 from ....nodes.base import base_models, BaseAgentTool
 
 
+# DOC: Conservative (inner) extents of the national DEM sources, as (west, south, east, north) in EPSG:4326.
+#      Boxes are kept inside each country so that a hit is unambiguous; AOIs that fall outside all of them
+#      get the pan-European or the global fallback below.
+_DEM_DATASET_EXTENTS = (     # DOC: west of -123° the US box stops at 48.2°N → Vancouver Island / Gulf Islands (Canada) are not matched to 3DEP
+    ('GECOSISTEMA/ITALY',       [ (7.4, 44.1, 12.3, 45.7), (12.3, 45.3, 13.4, 46.4), (10.5, 40.0, 15.5, 43.8), (15.5, 40.0, 18.5, 41.9), (15.6, 38.0, 17.1, 40.0), (12.4, 36.7, 15.6, 38.3), (8.1, 38.9, 9.8, 41.2) ]),
+    ('AHN/NETHERLANDS/05M',     [ (4.0, 51.9, 5.9, 53.4) ]),
+    ('NGI/BELGIUM/5M',          [ (3.4, 50.5, 5.6, 51.1) ]),
+    ('IGN/RGE_ALTI/1M',         [ (-1.5, 43.5, 6.0, 49.0), (-4.5, 47.5, -1.5, 48.6) ]),
+    ('IGN/ES/2M',               [ (-6.0, 37.0, 3.0, 42.3) ]),
+    ('UK/LIDAR',                [ (-5.0, 50.5, 1.5, 55.0), (-5.5, 55.0, -1.5, 58.5) ]),
+    ('DK-DEM',                  [ (8.1, 55.0, 10.6, 57.7), (11.0, 54.6, 12.6, 56.1) ]),
+    ('NO/KARTVERKET',           [ (5.0, 58.0, 11.0, 62.0) ]),
+    ('SWISSALTI3D/SWISS',       [ (6.7, 46.5, 9.4, 47.4) ]),
+    ('AU/GA/AUSTRALIA_5M_DEM',  [ (115.0, -38.0, 153.0, -20.0) ]),
+    ('NZ/LINZ',                 [ (166.5, -47.0, 178.5, -34.5) ]),
+    ('NRCAN/CDEM',              [ (-125.0, 49.5, -60.0, 60.0) ]),
+    ('USGS/3DEP/10m',           [ (-123.0, 32.8, -95.0, 49.0), (-124.0, 32.8, -123.0, 48.2), (-95.0, 30.0, -71.0, 41.5), (-83.0, 25.0, -80.0, 30.0) ]),
+    ('MX/LIDAR',                [ (-105.0, 17.0, -96.0, 23.0) ]),
+)
+_DEM_DATASETS = [ dataset for dataset, extents in _DEM_DATASET_EXTENTS for _ in extents ]
+_DEM_DATASETS_RTREE = shapely.STRtree([ box(*extent) for _, extents in _DEM_DATASET_EXTENTS for extent in extents ])
+
+# DOC: No national source → COPERNICUS/EUDEM inside Europe, NASADEM elsewhere
+_EUROPE_EXTENT = box(-25.0, 34.0, 45.0, 72.0)
+_DEM_DATASET_EUROPE = 'COPERNICUS/EUDEM'
+_DEM_DATASET_GLOBAL = 'NASA/NASADEM_HGT/001'
+
+
+# DOC: Layer registry templates of the Digital Twin outputs, keyed as the API 'files' response
+_DIGITAL_TWIN_LAYERS = MappingProxyType({
+    'dem': {
+        'title': 'Digital Twin DEM',
+        'description': 'Digital Twin DEM generated by SaferPlaces API',
+        'type': 'raster',
+        'metadata': { 'nodata': str(np.nan), 'colormap_name': 'viridis' },     # TODO: use a class ColorMaps
+    },
+    'building': {
+        'title': 'Digital Twin Buildings',
+        'description': 'Digital Twin Buildings generated by SaferPlaces API',
+        'type': 'vector',
+        'metadata': dict(),
+    },
+    'landuse': {
+        'title': 'Digital Twin Land Use',
+        'description': 'Digital Twin Land Use generated by SaferPlaces API',
+        'type': 'raster',
+        'metadata': { 'nodata': str(np.nan), 'colormap_name': 'tab10_r' },     # TODO: use a class ColorMaps
+    },
+    'dem_building': {
+        'title': 'Digital Twin DEM + Buildings',
+        'description': 'Digital Twin DEM + Buildings generated by SaferPlaces API',
+        'type': 'raster',
+        'metadata': { 'nodata': -9999, 'colormap_name': 'viridis' },           # TODO: use a class ColorMaps
+    },
+    'seamask': {
+        'title': 'Digital Twin Sea Mask',
+        'description': 'Digital Twin Sea Mask generated by SaferPlaces API',
+        'type': 'raster',
+        'metadata': { 'nodata': str(np.nan), 'colormap_name': 'tab10' },       # TODO: use a class ColorMaps
+    },
+})
+
+# DOC: Output sources of a 'files' response, in _DIGITAL_TWIN_LAYERS order
+_digital_twin_srcs = operator.itemgetter(*_DIGITAL_TWIN_LAYERS)
+
+# DOC: Output file names requested to the API, formatted with the run key
+_DIGITAL_TWIN_FILES = (
+    ('file_dem', 'dem-{key}.tif'),
+    ('file_building', 'building-{key}.shp'),
+    ('file_landuse', 'landuse-{key}.tif'),
+    ('file_dem_building', 'dem_building-{key}.tif'),
+    ('file_seamask', 'seamask-{key}.tif'),
+)
+
+# DOC: Largest DEM (in pixels) a single Digital Twin request may produce (~4 GB as float32)
+_MAX_DEM_PIXELS = 1_000_000_000
+
+
+# DOC: Process-level LRU of successful API responses, keyed by (project bucket, input hash).
+#      Entries expire after a TTL (outputs may be removed from S3) and are copied in and out → the cached dict is never shared with tool messages / checkpoints
+_DIGITAL_TWIN_RESPONSES = OrderedDict()
+_DIGITAL_TWIN_RESPONSES_MAXSIZE = 64
+_DIGITAL_TWIN_RESPONSES_TTL = 3600
+_digital_twin_responses_lock = threading.Lock()
+
+def _get_digital_twin_response(key: tuple) -> dict | None:
+    with _digital_twin_responses_lock:
+        entry = _DIGITAL_TWIN_RESPONSES.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() - entry[0] >= _DIGITAL_TWIN_RESPONSES_TTL:
+            del _DIGITAL_TWIN_RESPONSES[key]
+            return None
+        _DIGITAL_TWIN_RESPONSES.move_to_end(key)
+        return copy.deepcopy(entry[1])
+
+def _set_digital_twin_response(key: tuple, response: dict):
+    with _digital_twin_responses_lock:
+        _DIGITAL_TWIN_RESPONSES[key] = (time.monotonic(), copy.deepcopy(response))
+        _DIGITAL_TWIN_RESPONSES.move_to_end(key)
+        while len(_DIGITAL_TWIN_RESPONSES) > _DIGITAL_TWIN_RESPONSES_MAXSIZE:
+            _DIGITAL_TWIN_RESPONSES.popitem(last=False)
+
+
+def estimate_dem_pixels(bbox: base_models.BBox, pixelsize: float) -> int:
+    """
+    Approximate number of DEM pixels of the AOI at the given pixel size (meters).
+    """
+    mid_lat = math.radians((bbox.south + bbox.north) / 2)
+    width_m = (bbox.east - bbox.west) * 111_320 * math.cos(mid_lat)
+    height_m = (bbox.north - bbox.south) * 110_574
+    return int(math.ceil(width_m / pixelsize) * math.ceil(height_m / pixelsize))
+
+
+# DOC: Extents are given at 0.1° so a centroid rounded to 0.01° (~1 km) picks the same dataset
+@functools.lru_cache(maxsize=1024)
+def _dem_dataset_at(lon: float, lat: float) -> str:
+    centroid = Point(lon, lat)
+    idxs = _DEM_DATASETS_RTREE.query(centroid, predicate='intersects')
+    if len(idxs) > 0:
+        return _DEM_DATASETS[idxs[0]]
+    return _DEM_DATASET_EUROPE if _EUROPE_EXTENT.intersects(centroid) else _DEM_DATASET_GLOBAL
+
+
+def auto_select_dem_dataset(bbox: base_models.BBox) -> str:
+    """
+    Select the national DEM dataset covering the AOI centroid, COPERNICUS/EUDEM (Europe) or NASADEM (elsewhere) if no national source matches.
+    """
+    return _dem_dataset_at(round((bbox.west + bbox.east) / 2, 2), round((bbox.south + bbox.north) / 2, 2))
+
+
 class DigitalTwinInputSchema(BaseModel):
     """
     Create a geospatial **Digital Twin** for a given Area of Interest (AOI) by assembling:
@@ -29,39 +163,21 @@ class DigitalTwinInputSchema(BaseModel):
 
     The DEM is resampled to the requested `pixelsize` (meters) and all outputs are aligned over the AOI.
     """
+    # DOC: Validated once by the tool call and never mutated afterwards
+    model_config = ConfigDict(frozen=True)
 
     # ----------------------------- Data sources ------------------------------
     dataset_dem: Optional[str] = Field(
         default=None,
         title="DEM/DTM dataset",
         description=(
-            "Identifier of the elevation dataset to derive the DTM/DEM (catalog key or provider path). "
-            "You may set this explicitly (e.g., 'USGS/3DEP/1M') **or leave it as `None` to let the tool "
-            "auto-select the most suitable dataset from the AOI (bbox/place) using region-aware rules**.\n\n"
-            "Region-aware hints (preferred sources by AOI):\n"
-            "- **Italy** → GECOSISTEMA/ITALY\n"
-            "- **Netherlands** → AHN/NETHERLANDS/05M | AHN/NETHERLANDS/5M\n"
-            "- **Belgium** → NGI/BELGIUM/5M;  Flanders → VLAANDEREN/FLANDERS/BE/1M;  Wallonia → GEOPORTAIL/WALLONIE/BE/1M\n"
-            "- **France** → IGN/RGE_ALTI/1M\n"
-            "- **Spain** → IGN/ES/2M\n"
-            "- **UK** → UK/LIDAR\n"
-            "- **Denmark** → DK-DEM\n"
-            "- **Norway** → NO/KARTVERKET\n"
-            "- **Switzerland** → SWISSALTI3D/SWISS\n"
-            "- **Australia** → AU/GA/AUSTRALIA_5M_DEM | AU/GEOSCIENCE | ELVIS/AUSTRALIA | ICSM.GOV/AUSTRALIA\n"
-            "- **New Zealand** → NZ/LINZ\n"
-            "- **Canada** → NRCAN/CANADA/2M | NRCAN/CDEM\n"
-            "- **USA** → USGS/3DEP/1M | USGS/3DEP/10m | US/NED3 | US/NED10\n"
-            "- **Mexico** → MX/LIDAR\n"
-            "- **Angola** → ANGOLA/HUAMBO | ANGOLA/KUITO | ANGOLA/LOBITO | AIRBUS/ANGOLA\n"
-            "- **Pan-EU / Europe** → COPERNICUS/EUDEM\n"
-            "- **Global fallback** → NASA/NASADEM_HGT/001 | NASA/SRTM; **coastal** → DeltaDTM\n\n"
-            "Selection rules:\n"
-            "1) Prefer the **highest native resolution** covering the AOI; "
-            "2) for **coastal AOI**, consider **DeltaDTM**; "
-            "3) if no national source fits, use **COPERNICUS/EUDEM** (Europe) or global fallback."
+            "DEM dataset id (e.g. 'USGS/3DEP/10m', 'COPERNICUS/EUDEM'), "
+            "or `None` (preferred) to let the tool auto-pick the best national source from the bbox, "
+            "falling back to COPERNICUS/EUDEM in Europe and NASA/NASADEM_HGT/001 elsewhere. "
+            "Set it explicitly only for sources not auto-picked: DeltaDTM (coastal AOI), "
+            "VLAANDEREN/FLANDERS/BE/1M, GEOPORTAIL/WALLONIE/BE/1M, ANGOLA/HUAMBO | ANGOLA/KUITO | ANGOLA/LOBITO."
         ),
-        examples=["COPERNICUS/EUDEM", "USGS/3DEP/1M", None],
+        examples=["COPERNICUS/EUDEM", "USGS/3DEP/10m", None],
         validation_alias=AliasChoices("dataset_dem", "dem", "dtm", "dem_dataset", "dtm_dataset"),
     )
 
@@ -99,63 +215,70 @@ class DigitalTwinInputSchema(BaseModel):
     # ------------------------------ Resolution -------------------------------
     pixelsize: Optional[float] = Field(
         default = None,
-        title="DEM pixel size (meters). If not explicitly provided, prefer default value `None` as output resolution will be the native resolution of the DEM dataset.",
-        description="Target ground sampling distance (meters) for the DEM/DTM resampling. Must be > 0.",
+        title="DEM pixel size (meters)",
+        description=(
+            "Target ground sampling distance (meters) for the DEM/DTM resampling. Must be > 0. "
+            "Leave `None` unless the user asks for a resolution: the native resolution of the DEM dataset is used."
+        ),
         examples=[None, 1, 2, 5, 10, 30],
         validation_alias=AliasChoices("pixelsize", "pixel_size", "resolution", "res", "gsd"),
     )
 
 
-class DigitalTwinTool(BaseAgentTool):
+# DOC: Tool description for the LLM, built once at import
+_DIGITAL_TWIN_DESCRIPTION = (
+    "Generate a **geospatial Digital Twin** for a given Area of Interest (AOI). "
+    
+    "### Purpose\n"
+    "This tool is typically the **first step** in a workflow. It provides harmonized base layers "
+    "that can later be used by other tools, such as flood simulation, building analysis, or land-use planning.\n\n"
+
+    "### What it creates\n"
+    "- **DEM/DTM raster**, resampled to the requested pixel size (`pixelsize`).\n"
+    "- **Building footprints** for the AOI from the selected provider (`dataset_building`, default: 'OSM/BUILDINGS').\n"
+    "- **Land-use/land-cover** layer for the AOI (`dataset_land_use`, default: 'ESA/WorldCover/v100').\n"
+    "- **Sea mask** that separates land and water areas within the AOI.\n"
+    "- All outputs are spatially aligned and clipped to the AOI.\n\n"
+    
+    "### Capabilities\n"
+    "- Fetch a DEM/DTM from the specified dataset (if given, otherwise from the auto-detected most suitable dataset).\n"
+    "- Retrieve **building footprints** from the given provider or use the default OSM-based source.\n"
+    "- Retrieve **land-use/land-cover** information for better classification of terrain and regions.\n"
+    "- Generate a **land/sea mask** covering the AOI.\n"
+    "- Produce a set of harmonized layers ready for mapping, simulation, or other geospatial analyses.\n\n"
 
+    "### Inputs\n"
+    "- `dataset_dem (optional): Identifier of the DEM/DTM dataset **or `None`**. If `None`, the tool **auto-selects** the best dataset. \n"
+    "- `dataset_building` (optional, default 'OSM/BUILDINGS'): Provider for building footprints.\n"
+    "- `dataset_land_use` (optional, default 'ESA/WorldCover/v100'): Dataset for land-use/land-cover information.\n"
+    "- `bbox` (required): AOI as EPSG:4326 bounding box. Use named keys `west,south,east,north`. If user provides a location name, you have to infer the bounding box.\n"
+    "- `pixelsize` (optional): Desired DEM resolution in meters (> 0). Prefer None if user does not specify it, so the tool uses the native resolution of the DEM dataset.\n\n"
+
+    "### When to use this tool\n"
+    "- When the user explicitly asks for a **Digital Twin** of an area.\n"
+    "- When harmonized layers of DEM, buildings, and land-use are needed for further analysis or simulations.\n"
+    "- When a sea/land boundary mask is required for coastal or flood-related studies.\n"
+    "- When the AOI is provided as geographic coordinates (bbox).\n\n"
+
+    "### Behavior and defaults\n"
+    "- The bounding box must be in EPSG:4326 coordinates.\n"
+    "- If `dataset_dem` is **not provided** (None), the tool maps the AOI to country/region and selects a suitable DEM.\n"
+    "- If `dataset_building` or `dataset_land_use` are not provided, the defaults are used.\n"
+    "- Output is a set of raster and vector layers aligned on the same grid, ready for downstream tools and analyses.\n\n"
+
+    "### Output\n"
+    "The tool returns paths or URIs for each generated layer: DEM, buildings, land-use, and sea mask. "
+    "These outputs form the core components of the Digital Twin for the specified AOI."
+)
+
+
+class DigitalTwinTool(BaseAgentTool):
+    
     # DOC: Initialize the tool with a name, description and args_schema
     def __init__(self, **kwargs):
         super().__init__(
             name = N.DIGITAL_TWIN_TOOL,
-            description = (
-                "Generate a **geospatial Digital Twin** for a given Area of Interest (AOI). "
-                
-                "### Purpose\n"
-                "This tool is typically the **first step** in a workflow. It provides harmonized base layers "
-                "that can later be used by other tools, such as flood simulation, building analysis, or land-use planning.\n\n"
-
-                "### What it creates\n"
-                "- **DEM/DTM raster**, resampled to the requested pixel size (`pixelsize`).\n"
-                "- **Building footprints** for the AOI from the selected provider (`dataset_building`, default: 'OSM/BUILDINGS').\n"
-                "- **Land-use/land-cover** layer for the AOI (`dataset_land_use`, default: 'ESA/WorldCover/v100').\n"
-                "- **Sea mask** that separates land and water areas within the AOI.\n"
-                "- All outputs are spatially aligned and clipped to the AOI.\n\n"
-                
-                "### Capabilities\n"
-                "- Fetch a DEM/DTM from the specified dataset (if given, otherwise from the auto-detected most suitable dataset).\n"
-                "- Retrieve **building footprints** from the given provider or use the default OSM-based source.\n"
-                "- Retrieve **land-use/land-cover** information for better classification of terrain and regions.\n"
-                "- Generate a **land/sea mask** covering the AOI.\n"
-                "- Produce a set of harmonized layers ready for mapping, simulation, or other geospatial analyses.\n\n"
-
-                "### Inputs\n"
-                "- `dataset_dem (optional): Identifier of the DEM/DTM dataset **or `None`**. If `None`, the tool **auto-selects** the best dataset. \n"
-                "- `dataset_building` (optional, default 'OSM/BUILDINGS'): Provider for building footprints.\n"
-                "- `dataset_land_use` (optional, default 'ESA/WorldCover/v100'): Dataset for land-use/land-cover information.\n"
-                "- `bbox` (required): AOI as EPSG:4326 bounding box. Use named keys `west,south,east,north`. If user provides a location name, you have to infer the bounding box.\n"
-                "- `pixelsize` (optional): Desired DEM resolution in meters (> 0). Prefer None if user does not specify it, so the tool uses the native resolution of the DEM dataset.\n\n"
-
-                "### When to use this tool\n"
-                "- When the user explicitly asks for a **Digital Twin** of an area.\n"
-                "- When harmonized layers of DEM, buildings, and land-use are needed for further analysis or simulations.\n"
-                "- When a sea/land boundary mask is required for coastal or flood-related studies.\n"
-                "- When the AOI is provided as geographic coordinates (bbox).\n\n"
-
-                "### Behavior and defaults\n"
-                "- The bounding box must be in EPSG:4326 coordinates.\n"
-                "- If `dataset_dem` is **not provided** (None), the tool maps the AOI to country/region and selects a suitable DEM.\n"
-                "- If `dataset_building` or `dataset_land_use` are not provided, the defaults are used.\n"
-                "- Output is a set of raster and vector layers aligned on the same grid, ready for downstream tools and analyses.\n\n"
-
-                "### Output\n"
-                "The tool returns paths or URIs for each generated layer: DEM, buildings, land-use, and sea mask. "
-                "These outputs form the core components of the Digital Twin for the specified AOI."
-            ),
+            description = _DIGITAL_TWIN_DESCRIPTION,
             args_schema = DigitalTwinInputSchema,
             **kwargs
         )
@@ -165,12 +288,27 @@ class DigitalTwinTool(BaseAgentTool):
     
     # DOC: Validation rules ( i.e.: valid init and lead time ... ) 
     def _set_args_validation_rules(self) -> dict:
-        return dict()
+        return {
+            'pixelsize': [
+                lambda **ka: f"Invalid pixelsize: {ka['pixelsize']}. It must be greater than 0."
+                    if ka.get('pixelsize') is not None and ka['pixelsize'] <= 0 else None,
+                lambda **ka: f"The AOI is too large for a {ka['pixelsize']} m DEM (~{estimate_dem_pixels(ka['bbox'], ka['pixelsize']):,} pixels, max {_MAX_DEM_PIXELS:,}). Use a coarser pixelsize or split the AOI in smaller areas."
+                    if ka.get('pixelsize') is not None and ka['pixelsize'] > 0 and ka.get('bbox') is not None and estimate_dem_pixels(ka['bbox'], ka['pixelsize']) > _MAX_DEM_PIXELS else None,
+            ]
+        }
         
     
     # DOC: Inference rules ( i.e.: from location name to bbox ... )
     def _set_args_inference_rules(self) -> dict:
-        infer_rules = dict()
+        
+        def infer_dataset_dem(**ka):
+            if ka.get('dataset_dem') is None and ka.get('bbox') is not None:
+                return auto_select_dem_dataset(ka['bbox'])
+            return None
+        
+        infer_rules = {
+            'dataset_dem': infer_dataset_dem,
+        }
         return infer_rules
         
     
@@ -181,111 +319,92 @@ class DigitalTwinTool(BaseAgentTool):
         **kwargs: Any,  # dict[str, Any] = None,
     ): 
         # DOC: Prepare the payload for Digital-Twin API
-        api_url = f"{os.getenv('SAFERPLACES_API_ROOT', 'http://localhost:5000')}/processes/digital-twin-process/execution"
-        
-        exec_uuid = utils.b64uuid()
+        api_env = utils.saferplaces_api_env('digital-twin-process')
+        api_url = api_env.api_url
         
         kwargs['bbox'] = kwargs['bbox'].to_list()
         
+        # DOC: Deterministic key of the inputs → same AOI / datasets / resolution produce the same output files
+        aoi_hash = hashlib.blake2b(json.dumps(kwargs, sort_keys=True, default=str).encode(), digest_size=8).hexdigest()
+        
+        # DOC: If all the outputs for this AOI are already in the layer registry, skip the API call
+        registry_srcs = { utils.juststem(layer['src']): layer['src'] for layer in self.graph_state.get('layer_registry', []) }
+        output_stems = { key: f'{key}-{aoi_hash}' for key in _DIGITAL_TWIN_LAYERS }
+        if all(stem in registry_srcs for stem in output_stems.values()):
+            return {
+                'tool_response': {
+                    'id': 'digital-twin-process',
+                    'files': { key: registry_srcs[stem] for key, stem in output_stems.items() },
+                    'cached': True,
+                }
+            }
+        
+        workspace, project = s3_utils.get_bucket_name_key(s3_utils._BASE_BUCKET)
         additional_args = {
-            "workspace": s3_utils.get_bucket_name_key(s3_utils._BASE_BUCKET)[0],
-            "project": s3_utils.get_bucket_name_key(s3_utils._BASE_BUCKET)[1],
-            "file_dem": f'dem-{exec_uuid}.tif',
-            "file_building": f'building-{exec_uuid}.shp',
-            "file_landuse": f'landuse-{exec_uuid}.tif',
-            "file_dem_building": f'dem_building-{exec_uuid}.tif',
-            "file_seamask": f'seamask-{exec_uuid}.tif',
+            "workspace": workspace,
+            "project": project,
+            **{ arg: template.format(key=aoi_hash) for arg, template in _DIGITAL_TWIN_FILES },
         }
         
         credentials_args = {
-            "user": os.getenv("SAFERPLACES_API_USER"),
-            "token": os.getenv("SAFERPLACES_API_TOKEN"),
+            "user": api_env.api_user,
+            "token": api_env.api_token,
         }
         
         debug_args = {
-            "debug": True,  # TODO: use a global _is_debug_mode() to set this
+            "debug": utils.is_debug_mode(),
         }
 
         payload = { 
             "inputs": {
-                **kwargs,               # DOC: This will include the args from the input schema
+                # DOC: Unset optional args are omitted → the API works at the dataset native resolution and avoids server-side resampling
+                **{ k: v for k, v in kwargs.items() if v is not None },
                 **additional_args,      # DOC: Additional args for the API call
                 **credentials_args,     # DOC: Credentials for the API call
                 **debug_args,           # DOC: Debug args for the API call
             }
         }
         
-        # DOC: Call the Digital-Twin API ...
-        api_response = requests.post(api_url, json=payload)
+        # DOC: Same inputs in the same project already served in this process → reuse the response, outputs are deterministic
+        response_key = (s3_utils._BASE_BUCKET, aoi_hash)
+        api_response = _get_digital_twin_response(response_key)
         
-        # DOC: If the API call fails, return an error response
-        if api_response.status_code != 200:
-            tool_response = {
-                'tool_response': {
-                    'error': f"Failed to execute Digital Twin API: {api_response.status_code} - {api_response.text}"
+        if api_response is None:
+            # DOC: Call the Digital-Twin API ...
+            api_response = utils.post_json(api_url, payload)
+            
+            # DOC: If the API call fails, return an error response
+            if api_response.status_code != 200:
+                tool_response = {
+                    'tool_response': {
+                        'error': f"Failed to execute Digital Twin API: {api_response.status_code} - {api_response.text}"
+                    }
                 }
-            }
+            
+            api_response = utils.response_json(api_response)
+            
+            # DOC: Cache only fresh successful responses → a hit never refreshes its own TTL
+            if api_response.get('id') == 'digital-twin-process' and len(api_response.get('files', dict)) > 0:
+                _set_digital_twin_response(response_key, api_response)
         
         # DOC: If the API call is successful, process the response 
-        api_response = api_response.json()
         if api_response.get('id') == 'digital-twin-process' and len(api_response.get('files', dict)) > 0:
+            existing_srcs = GraphStates.layer_registry_srcs(self.graph_state)
+            new_layers = [
+                {
+                    'title': GraphStates.new_layer_title(self.graph_state, layer['title']),
+                    'description': layer['description'],
+                    'type': layer['type'],
+                    'src': src,
+                    'metadata': dict(layer['metadata']),
+                }
+                for layer, src in zip(_DIGITAL_TWIN_LAYERS.values(), _digital_twin_srcs(api_response['files']))
+                if src not in existing_srcs
+            ]
+            # DOC: The layer_registry reducer merges by src → return only the new entries, and no key at all if all the outputs are already registered
             tool_response = {
                 'tool_response': api_response,
-                'updates': {
-                    'layer_registry': self.graph_state.get('layer_registry', []) + ([
-                        {
-                            'title': GraphStates.new_layer_title(self.graph_state, 'Digital Twin DEM'),
-                            'description': 'Digital Twin DEM generated by SaferPlaces API',
-                            'type': 'raster',
-                            'src': api_response['files']['dem'],
-                            'metadata': {
-                                'nodata': str(np.nan),
-                                'colormap_name': 'viridis',  # TODO: use a class ColorMaps
-                            },
-                        }, 
-                    ] if not GraphStates.src_layer_exists(self.graph_state, api_response['files']['dem']) else []) + ([
-                        {
-                            'title': GraphStates.new_layer_title(self.graph_state, 'Digital Twin Buildings'),
-                            'description': 'Digital Twin Buildings generated by SaferPlaces API',
-                            'type': 'vector',
-                            'src': api_response['files']['building'],
-                            'metadata': dict(),
-                        }
-                    ] if not GraphStates.src_layer_exists(self.graph_state, api_response['files']['building']) else []) + ([
-                        {
-                            'title': GraphStates.new_layer_title(self.graph_state, 'Digital Twin Land Use'),
-                            'description': 'Digital Twin Land Use generated by SaferPlaces API',
-                            'type': 'raster',
-                            'src': api_response['files']['landuse'],
-                            'metadata': {
-                                'nodata': str(np.nan),
-                                'colormap_name': 'tab10_r',  # TODO: use a class ColorMaps
-                            }
-                        }
-                    ] if not GraphStates.src_layer_exists(self.graph_state, api_response['files']['landuse']) else []) + ([
-                        {
-                            'title': GraphStates.new_layer_title(self.graph_state, 'Digital Twin DEM + Buildings'),
-                            'description': 'Digital Twin DEM + Buildings generated by SaferPlaces API',
-                            'type': 'raster',
-                            'src': api_response['files']['dem_building'],
-                            'metadata': {
-                                'nodata': -9999,
-                                'colormap_name': 'viridis',  # TODO: use a class ColorMaps
-                            }
-                        }
-                    ] if not GraphStates.src_layer_exists(self.graph_state, api_response['files']['dem_building']) else []) + ([
-                        {
-                            'title': GraphStates.new_layer_title(self.graph_state, 'Digital Twin Sea Mask'),
-                            'description': 'Digital Twin Sea Mask generated by SaferPlaces API',
-                            'type': 'raster',
-                            'src': api_response['files']['seamask'],
-                            'metadata': {
-                                'nodata': str(np.nan),
-                                'colormap_name': 'tab10',  # TODO: use a class ColorMaps
-                            }
-                        }
-                    ] if not GraphStates.src_layer_exists(self.graph_state, api_response['files']['seamask']) else [])
-                }
+                'updates': { 'layer_registry': new_layers } if new_layers else dict(),
             }
             
         # DOC: If the API call is successful but the response is not as expected, return an error response
@@ -309,17 +428,3 @@ class DigitalTwinTool(BaseAgentTool):
     def _on_tool_end(self):
         self.execution_confirmed = False
         self.output_confirmed = True
-        
-    
-    # DOC: Try running AgentTool → Will check required, validity and inference over arguments thatn call and return _execute()
-    def _run(
-        self, 
-        /,
-        **kwargs: Any, # dict[str, Any] = None,
-    ) -> dict:
-        
-        run_manager: Optional[CallbackManagerForToolRun] = kwargs.pop("run_manager", None)
-        return super()._run(
-            tool_args = kwargs,
-            run_manager = run_manager
-        )
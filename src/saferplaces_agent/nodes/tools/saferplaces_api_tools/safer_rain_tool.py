@@ -1,18 +1,11 @@
-import os
-import datetime
-from dateutil import relativedelta
-from enum import Enum
-import requests
+import functools
+from types import MappingProxyType
 import numpy as np
 
-from typing import Optional, Literal, Union, List, Dict, Any
-from pydantic import BaseModel, Field, AliasChoices, field_validator, model_validator
+from typing import Optional, Literal, Union, Any
+from pydantic import BaseModel, ConfigDict, Field, AliasChoices
 
-from langchain_core.messages import SystemMessage, HumanMessage
-from langchain_core.callbacks import (
-    AsyncCallbackManagerForToolRun,
-    CallbackManagerForToolRun,
-)
+from langchain_core.messages import SystemMessage
 
 from ....common import utils, s3_utils
 from ....common import names as N
@@ -23,6 +16,17 @@ from ....nodes.base import BaseAgentTool
 _URI_HINT = "HTTP(S) URL, S3 URI (s3://...)"
 
 
+# DOC: Shared Field for the raster inputs/outputs, referenced by URL / S3 URI or by a Layer Registry `src`
+def _uri_field(title: str, description: str, aliases: tuple, examples: tuple, default: Any = ...):
+    return Field(
+        default,
+        title=title,
+        description=description,
+        examples=list(examples),
+        validation_alias=AliasChoices(*aliases),
+    )
+
+
 class SaferRainInputSchema(BaseModel):
     """
     Run a flood simulation using a terrain elevation raster (DEM/DTM) and rainfall input
@@ -30,30 +34,26 @@ class SaferRainInputSchema(BaseModel):
     If the rainfall raster is multiband, bands are interpreted as a time series and
     can be cumulatively summed over a band range.
     """
+    # DOC: Validated once by the tool call and never mutated afterwards
+    model_config = ConfigDict(frozen=True)
 
     # ----------------------------- Required inputs -----------------------------
-    dem: str = Field(
-        ...,
-        title="DEM (GeoTIFF)",
-        description=(
+    dem: str = _uri_field(
+        "DEM (GeoTIFF)",
+        (
             "Digital Elevation Model raster used as ground elevation.\n"
             "- You can pass a direct URL, S3 URI, or local path to a GeoTIFF.\n"
             "- Or you can reference an **existing project raster layer** "
             "from the Layer Registry (e.g., when the user says 'use the DTM of Rome').\n"
             "- When a layer is referenced, use that layer's `src` value."
         ),
-        examples=[
-            "https://example.com/dem_10m.tif",
-            "s3://bucket/project/dtm_rome.tif",
-            "Rome DTM"
-        ],
-        validation_alias=AliasChoices("dem", "dtm", "elevation", "dem_path"),
+        aliases=("dem", "dtm", "elevation", "dem_path"),
+        examples=("https://example.com/dem_10m.tif", "s3://bucket/project/dtm_rome.tif", "Rome DTM"),
     )
 
-    rain: Union[str, float] = Field(
-        ...,
-        title="Rainfall input (raster or constant)",
-        description=(
+    rain: Union[str, float] = _uri_field(
+        "Rainfall input (raster or constant)",
+        (
             "Rainfall data for the simulation.\n"
             "- It can be a **numeric value** (uniform rainfall in millimeters applied to the whole DEM extent).\n"
             "- Or a URL, S3 URI, or local path to a rainfall raster (GeoTIFF).\n"
@@ -61,27 +61,19 @@ class SaferRainInputSchema(BaseModel):
             "from the Layer Registry (e.g., 'use layer rainfall-*').\n"
             "- When a layer is referenced, the tool will internally use that layer's `src` value."
         ),
-        examples=[
-            25.0,
-            "https://example.com/rainfall_2025_05.tif",
-            "s3://bucket/project/rainfall_v1.tif",
-            "Rainfall V1"
-        ],
-        validation_alias=AliasChoices("rain", "rainfall", "rain_path", "precip", "precipitation"),
+        aliases=("rain", "rainfall", "rain_path", "precip", "precipitation"),
+        examples=(25.0, "https://example.com/rainfall_2025_05.tif", "s3://bucket/project/rainfall_v1.tif", "Rainfall V1"),
     )
 
-    water: Optional[str] = Field(
-        default=None,
-        title="Output Water Depth (GeoTIFF, optional)",
-        description=(
+    water: Optional[str] = _uri_field(
+        "Output Water Depth (GeoTIFF, optional)",
+        (
             f"Destination {_URI_HINT} where the simulated water depth raster (GeoTIFF) will be written. "
             "If omitted, the tool returns the path/URI produced by the execution environment."
         ),
-        examples=[
-            "https://example.com/outputs/water_depth.tif",
-            "s3://my-bucket/floods/wd.tif",
-        ],
-        validation_alias=AliasChoices("water", "waterdepth", "wd", "water_path"),
+        aliases=("water", "waterdepth", "wd", "water_path"),
+        examples=("https://example.com/outputs/water_depth.tif", "s3://my-bucket/floods/wd.tif"),
+        default=None,
     )
 
     # ------------------------------- Parameters --------------------------------
@@ -127,35 +119,76 @@ class SaferRainInputSchema(BaseModel):
         validation_alias=AliasChoices("mode", "execution_mode", "run_mode"),
     )
 
+
+# DOC: Same bucket + filename → same URI, memoized across invocations (the bucket is part of the key so env refreshes are honored)
+@functools.lru_cache(maxsize=256)
+def _water_uri(bucket: str, water: str) -> str:
+    return f"{bucket}/saferrain-out/{water}"
+
+def _infer_water(**kwargs):
+    """
+    Infer the S3 bucket destination based on user ID and project ID.
+    """
+    water = kwargs.get('water')
+    if water is None:
+        # DOC: Generated names are unique, no point in caching them
+        return f"{s3_utils._BASE_BUCKET}/saferrain-out/water-depth-{utils.b64uuid()}.tif"
+    return _water_uri(s3_utils._BASE_BUCKET, water)
+
+def _infer_mode(**kwargs):
+    """
+    Infer the execution mode based on the provided arguments. It forces the mode to 'lambda' for now.
+    """
+    return 'lambda'
+
+# DOC: Inference rules are stateless (the bucket is read at call time) → one shared mapping for every run
+_SAFER_RAIN_INFERENCE_RULES = MappingProxyType({
+    'water': _infer_water,
+    'mode': _infer_mode,
+})
+
+
+# DOC: Layer registry template of the SaferRain water depth output
+_WATER_DEPTH_LAYER = MappingProxyType({
+    'title': 'SaferRain Output',
+    'type': 'raster',
+    'metadata': { 'nodata': str(np.nan), 'colormap_name': 'blues' },      # TODO: use a class ColorMaps
+})
+
+
+# DOC: Tool description for the LLM, built once at import
+_SAFER_RAIN_DESCRIPTION = (
+    "Run a **flood simulation** using a Digital Elevation Model (DEM) and rainfall input.\n\n"
+    "Rainfall can be provided as:\n"
+    "- A **constant numeric value** in millimeters (applied uniformly across the DEM extent), or\n"
+    "- A **rainfall raster** (GeoTIFF). If the raster is **multiband**, each band represents a time step, "
+    "and rainfall can be **cumulatively summed** between `band` and `to_band`.\n\n"
+    "**Layer Registry Integration:**\n"
+    "- The project context may include a set of preloaded geospatial layers (DEM, rainfall, etc.).\n"
+    "- For `dem` and `rain`, you can pass either a direct URL/S3 URI or **reference an existing project layer** "
+    "by its `src` as shown in the Layer Registry.\n"
+    "- When a layer is referenced by title, the tool will internally resolve it and use its `src` as input.\n\n"
+    "### Outputs:\n"
+    "- A **water-depth raster (GeoTIFF)** representing simulated flood depths over the DEM area. "
+    "If the `water` argument is omitted, the tool will return the path/URI of the generated file."
+)
+
     
 # DOC: This is a demo tool to retrieve weather data.
 class SaferRainTool(BaseAgentTool):
-        
+    
+    # DOC: Human-in-the-loop defaults → ask the user to confirm the args, not the output
+    execution_confirmed: bool = False
+    output_confirmed: bool = True
     
     # DOC: Initialize the tool with a name, description and args_schema
     def __init__(self, **kwargs):
         super().__init__(
             name = N.SAFER_RAIN_TOOL,
-            description = (
-                "Run a **flood simulation** using a Digital Elevation Model (DEM) and rainfall input.\n\n"
-                "Rainfall can be provided as:\n"
-                "- A **constant numeric value** in millimeters (applied uniformly across the DEM extent), or\n"
-                "- A **rainfall raster** (GeoTIFF). If the raster is **multiband**, each band represents a time step, "
-                "and rainfall can be **cumulatively summed** between `band` and `to_band`.\n\n"
-                "**Layer Registry Integration:**\n"
-                "- The project context may include a set of preloaded geospatial layers (DEM, rainfall, etc.).\n"
-                "- For `dem` and `rain`, you can pass either a direct URL/S3 URI or **reference an existing project layer** "
-                "by its `src` as shown in the Layer Registry.\n"
-                "- When a layer is referenced by title, the tool will internally resolve it and use its `src` as input.\n\n"
-                "### Outputs:\n"
-                "- A **water-depth raster (GeoTIFF)** representing simulated flood depths over the DEM area. "
-                "If the `water` argument is omitted, the tool will return the path/URI of the generated file."
-            ),
+            description = _SAFER_RAIN_DESCRIPTION,
             args_schema = SaferRainInputSchema,
             **kwargs
         )
-        self.execution_confirmed = False
-        self.output_confirmed = True
 
 
     # DOC: Validation rules ( i.e.: valid init and lead time ... ) 
@@ -165,24 +198,7 @@ class SaferRainTool(BaseAgentTool):
     
     # DOC: Inference rules ( i.e.: from location name to bbox ... )
     def _set_args_inference_rules(self) -> dict:
-        def infer_water(**kwargs):
-            """
-            Infer the S3 bucket destination based on user ID and project ID.
-            """
-            water = kwargs.get('water', f"water-depth-{utils.b64uuid()}.tif")
-            return f"{s3_utils._BASE_BUCKET}/saferrain-out/{water}"
-        
-        def infer_mode(**kwargs):
-            """
-            Infer the execution mode based on the provided arguments. It forces the mode to 'lambda' for now.
-            """
-            return 'lambda'
-            
-        infer_rules = {
-            'water': infer_water,
-            'mode': infer_mode,
-        }
-        return infer_rules
+        return _SAFER_RAIN_INFERENCE_RULES
         
     
     # DOC: Execute the tool → Build notebook, write it to a file and return the path to the notebook and the zarr output file
@@ -192,15 +208,16 @@ class SaferRainTool(BaseAgentTool):
         **kwargs: Any,  # dict[str, Any] = None,
     ): 
         # DOC: Prepare the payload for Safer-Rain API
-        api_url = f"{os.getenv('SAFERPLACES_API_ROOT', 'http://localhost:5000')}/processes/safer-rain-process/execution"
+        api_env = utils.saferplaces_api_env('safer-rain-process')
+        api_url = api_env.api_url
         
         credentials_args = {
-            "user": os.getenv("SAFERPLACES_API_USER"),
-            "token": os.getenv("SAFERPLACES_API_TOKEN"),
+            "user": api_env.api_user,
+            "token": api_env.api_token,
         }
         
         debug_args = {
-            "debug": True,  # TODO: use a global _is_debug_mode() to set this
+            "debug": utils.is_debug_mode(),
         }
         
         payload = {
@@ -212,7 +229,7 @@ class SaferRainTool(BaseAgentTool):
         }
         
         # DOC: Call the Safer-Rain API ...
-        api_response = requests.post(api_url, json=payload)
+        api_response = utils.post_json(api_url, payload)
         
         # DOC: If the API call fails, return an error response
         if api_response.status_code != 200:
@@ -223,28 +240,23 @@ class SaferRainTool(BaseAgentTool):
             }
             
         # DOC: If the API call is successful, process the response 
-        api_response = api_response.json()
+        api_response = utils.response_json(api_response)
         if 'water_depth_file' in api_response:
             tool_response = {
                 'tool_response': api_response,
-                'updates': {
-                    # TODO: add only safer-rain related layer if not present (or maybe add with modified description telling they were used for this simulation)
-                    'layer_registry': self.graph_state.get('layer_registry', []) + [
-                        {
-                            'title': GraphStates.new_layer_title(self.graph_state, "SaferRain Output"),
-                            'description': f"SaferRain output file with flooding waterdepth from this inputs: ({', '.join([f'{k}: {v}' for k,v in kwargs.items() if k!='water'])})",
-                            'src': api_response['water_depth_file'],
-                            'type': 'raster',
-                            'metadata': {
-                                'nodata': str(np.nan),
-                                'colormap_name': 'blues',  # TODO: use a class ColorMaps
-                            }
-                        }
-                    ]
-                    if not GraphStates.src_layer_exists(self.graph_state, api_response['water_depth_file'])
-                    else []
-                }
+                'updates': dict(),
             }
+            # DOC: The layer_registry reducer merges by src → return only the new entry, and no key at all if the output is already registered
+            if not GraphStates.src_layer_exists(self.graph_state, api_response['water_depth_file']):
+                tool_response['updates']['layer_registry'] = [
+                    {
+                        'title': GraphStates.new_layer_title(self.graph_state, _WATER_DEPTH_LAYER['title']),
+                        'description': f"SaferRain output file with flooding waterdepth from this inputs: ({', '.join(f'{k}: {v}' for k,v in kwargs.items() if k!='water' and v is not None)})",
+                        'src': api_response['water_depth_file'],
+                        'type': _WATER_DEPTH_LAYER['type'],
+                        'metadata': dict(_WATER_DEPTH_LAYER['metadata']),
+                    }
+                ]
             
         # DOC: If the API call is successful but the response is not as expected, return an error response
         else:
@@ -267,17 +279,3 @@ class SaferRainTool(BaseAgentTool):
     def _on_tool_end(self):
         self.execution_confirmed = False
         self.output_confirmed = True
-        
-    
-    # DOC: Try running AgentTool → Will check required, validity and inference over arguments thatn call and return _execute()
-    def _run(
-        self, 
-        /,
-        **kwargs: Any, # dict[str, Any] = None,
-    ) -> dict:
-        
-        run_manager: Optional[CallbackManagerForToolRun] = kwargs.pop("run_manager", None)
-        return super()._run(
-            tool_args = kwargs,
-            run_manager = run_manager
-        )
\ No newline at end of file
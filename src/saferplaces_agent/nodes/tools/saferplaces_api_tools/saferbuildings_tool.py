@@ -1,17 +1,7 @@
-import os
-import datetime
-from dateutil import relativedelta
-from enum import Enum
-import requests
-
-from typing import Optional, Union, List, Dict, Any, Literal
-from pydantic import BaseModel, Field, AliasChoices, field_validator, model_validator
+from typing import Optional, List, Any, Literal
+from pydantic import BaseModel, Field
 
 from langchain_core.messages import SystemMessage
-from langchain_core.callbacks import (
-    AsyncCallbackManagerForToolRun,
-    CallbackManagerForToolRun,
-)
 
 from ....common import utils, s3_utils
 from ....common import names as N
@@ -76,18 +66,6 @@ class SaferBuildingsInputSchema(BaseModel):
         ],
     )
 
-    provider: Optional[ProviderCode] = Field(
-        default=None,
-        title="Buildings Provider (optional)",
-        description=(
-            "Provider to retrieve buildings when `buildings` is not supplied. "
-            "Allowed: OVERTURE | RER-REST/* | VENEZIA-WFS/* | VENEZIA-WFS-CRITICAL-SITES."
-            "OVERTURE covers the entire world, so it is the default provider. "
-            "RER-REST/* is for Emilia-Romagna region in Italy. "
-            "VENEZIA-WFS/* is for Venice, and VENEZIA-WFS-CRITICAL-SITES is for critical sites in Venice."
-        ),
-        examples=["OVERTURE", "RER-REST/*"],
-    )
     provider: Optional[ProviderCode] = Field(
         default=None,
         title="Buildings Provider (mutually exclusive with `buildings`)",
@@ -227,64 +205,69 @@ class SaferBuildingsInputSchema(BaseModel):
 
 
 
+# DOC: Tool description for the LLM, built once at import
+_SAFERBUILDINGS_DESCRIPTION = (
+    "Use this tool to **detect flooded buildings** from a water depth raster (GeoTIFF). "
+    "It supports two modes for obtaining building geometries:\n"
+    "1. **Direct file input (`buildings`)** – use this when you already have a buildings dataset.\n"
+    "2. **Provider-based fetching (`provider`)** – use this when you don't have a local file and want to fetch building data automatically.\n\n"
+    "**Important:** `buildings` and `provider` are **mutually exclusive**.\n"
+    "- If you provide a `buildings` file or reference a project layer, **do NOT set `provider`**.\n"
+    "- If you want to fetch building data from a provider, **leave `buildings` empty** and set `provider`.\n\n"
+    "### What this tool produces:\n"
+    "- A **vector output file** (`out`) containing **all buildings** in the analysis area.\n"
+    "- Each building feature includes:\n"
+    "  - `is_flooded`: Boolean flag indicating if the building is flooded above the threshold (`wd_thresh`).\n"
+    "  - If `stats=true`, additional fields:\n"
+    "    - `wd_min`: Minimum water depth inside the building footprint.\n"
+    "    - `wd_mean`: Mean water depth inside the building footprint.\n"
+    "    - `wd_max`: Maximum water depth inside the building footprint.\n"
+    "- If `summary=true`, the tool also returns **aggregated statistics** grouped by selected attributes "
+    "(`summary_on`). This summary is **not saved into the vector file** but is returned as metadata.\n\n"
+    "### Typical use cases:\n"
+    "- Identify which buildings are flooded above a given water depth threshold.\n"
+    "- Generate a vector layer with flood status and per-building water statistics.\n"
+    "- Produce summaries grouped by building type, class, or provider-specific attributes.\n\n"
+    "### Key arguments:\n"
+    "- `water` (required): URL or S3 URI of the water depth raster.\n"
+    "- `buildings` (optional): URL or S3 URI of a buildings dataset. "
+    "Mutually exclusive with `provider`.\n"
+    "- `provider` (optional): Provider for building geometries. "
+    "Mutually exclusive with `buildings`. Supported values: OVERTURE, RER-REST/*, VENEZIA-WFS/*, VENEZIA-WFS-CRITICAL-SITES.\n"
+    "- `filters`: Optional JSON object for filtering provider data.\n"
+    "- `bbox`: Limit analysis to a geographic extent (EPSG:4326). If omitted, the water raster bounds are used.\n"
+    "- `wd_thresh`: Flood threshold in meters (default 0.5).\n"
+    "- `flood_mode`: How to detect flood relative to buildings — "
+    "`BUFFER` (around buildings), `IN-AREA` (inside buildings), or `ALL` (both).\n"
+    "- `stats`: Compute water depth stats per flooded building (`wd_min`, `wd_mean`, `wd_max`).\n"
+    "- `summary`: Compute aggregated statistics grouped by `summary_on`. "
+    "If `summary_on` is not provided, defaults depend on provider "
+    "(e.g., `subtype` for OVERTURE, `service_class` for RER-REST, `service_id` for VENEZIA-WFS).\n"
+    "- `out`: Destination URL or S3 URI to save the output vector file.\n"
+    "- `out_geojson`: If true, results are returned in-memory as a GeoJSON FeatureCollection instead of being saved.\n"
+    "- `only_flood`: If true, only flooded buildings are included in the output.\n\n"
+    "### Agent notes:\n"
+    "- Check if the user is providing a file (`buildings`) or requesting data from a provider. Never set both.\n"
+    "- Always include the `is_flooded` attribute in the output.\n"
+    "- Prefer `bbox` with named keys to avoid coordinate order mistakes."
+)
+
+
 # DOC: This is a demo tool to retrieve weather data.
 class SaferBuildingsTool(BaseAgentTool):
-        
+    
+    # DOC: Human-in-the-loop defaults → ask the user to confirm the args, not the output
+    execution_confirmed: bool = False
+    output_confirmed: bool = True
     
     # DOC: Initialize the tool with a name, description and args_schema
     def __init__(self, **kwargs):
         super().__init__(
             name = N.SAFERBUILDINGS_TOOL,
-            description = (
-                "Use this tool to **detect flooded buildings** from a water depth raster (GeoTIFF). "
-                "It supports two modes for obtaining building geometries:\n"
-                "1. **Direct file input (`buildings`)** – use this when you already have a buildings dataset.\n"
-                "2. **Provider-based fetching (`provider`)** – use this when you don't have a local file and want to fetch building data automatically.\n\n"
-                "**Important:** `buildings` and `provider` are **mutually exclusive**.\n"
-                "- If you provide a `buildings` file or reference a project layer, **do NOT set `provider`**.\n"
-                "- If you want to fetch building data from a provider, **leave `buildings` empty** and set `provider`.\n\n"
-                "### What this tool produces:\n"
-                "- A **vector output file** (`out`) containing **all buildings** in the analysis area.\n"
-                "- Each building feature includes:\n"
-                "  - `is_flooded`: Boolean flag indicating if the building is flooded above the threshold (`wd_thresh`).\n"
-                "  - If `stats=true`, additional fields:\n"
-                "    - `wd_min`: Minimum water depth inside the building footprint.\n"
-                "    - `wd_mean`: Mean water depth inside the building footprint.\n"
-                "    - `wd_max`: Maximum water depth inside the building footprint.\n"
-                "- If `summary=true`, the tool also returns **aggregated statistics** grouped by selected attributes "
-                "(`summary_on`). This summary is **not saved into the vector file** but is returned as metadata.\n\n"
-                "### Typical use cases:\n"
-                "- Identify which buildings are flooded above a given water depth threshold.\n"
-                "- Generate a vector layer with flood status and per-building water statistics.\n"
-                "- Produce summaries grouped by building type, class, or provider-specific attributes.\n\n"
-                "### Key arguments:\n"
-                "- `water` (required): URL or S3 URI of the water depth raster.\n"
-                "- `buildings` (optional): URL or S3 URI of a buildings dataset. "
-                "Mutually exclusive with `provider`.\n"
-                "- `provider` (optional): Provider for building geometries. "
-                "Mutually exclusive with `buildings`. Supported values: OVERTURE, RER-REST/*, VENEZIA-WFS/*, VENEZIA-WFS-CRITICAL-SITES.\n"
-                "- `filters`: Optional JSON object for filtering provider data.\n"
-                "- `bbox`: Limit analysis to a geographic extent (EPSG:4326). If omitted, the water raster bounds are used.\n"
-                "- `wd_thresh`: Flood threshold in meters (default 0.5).\n"
-                "- `flood_mode`: How to detect flood relative to buildings — "
-                "`BUFFER` (around buildings), `IN-AREA` (inside buildings), or `ALL` (both).\n"
-                "- `stats`: Compute water depth stats per flooded building (`wd_min`, `wd_mean`, `wd_max`).\n"
-                "- `summary`: Compute aggregated statistics grouped by `summary_on`. "
-                "If `summary_on` is not provided, defaults depend on provider "
-                "(e.g., `subtype` for OVERTURE, `service_class` for RER-REST, `service_id` for VENEZIA-WFS).\n"
-                "- `out`: Destination URL or S3 URI to save the output vector file.\n"
-                "- `out_geojson`: If true, results are returned in-memory as a GeoJSON FeatureCollection instead of being saved.\n"
-                "- `only_flood`: If true, only flooded buildings are included in the output.\n\n"
-                "### Agent notes:\n"
-                "- Check if the user is providing a file (`buildings`) or requesting data from a provider. Never set both.\n"
-                "- Always include the `is_flooded` attribute in the output.\n"
-                "- Prefer `bbox` with named keys to avoid coordinate order mistakes."
-            ),
+            description = _SAFERBUILDINGS_DESCRIPTION,
             args_schema = SaferBuildingsInputSchema,
             **kwargs
         )
-        self.execution_confirmed = False
-        self.output_confirmed = True
         
     
     # DOC: Validation rules ( i.e.: valid init and lead time ... ) 
@@ -300,7 +283,7 @@ class SaferBuildingsTool(BaseAgentTool):
             """
             Infer the S3 bucket destination based on user ID and project ID.
             """
-            out = kwargs.get('out', f"flooded-buildings-{utils.b64uuid()}.geojson")
+            out = kwargs.get('out') or f"flooded-buildings-{utils.b64uuid()}.geojson"     # DOC: random name only when no output is given
             return f"{s3_utils._BASE_BUCKET}/saferbuildings-out/{out}"
             
         infer_rules = {
@@ -316,17 +299,18 @@ class SaferBuildingsTool(BaseAgentTool):
         **kwargs: Any,  # dict[str, Any] = None,
     ): 
         # DOC: Prepare the payload to Safer-Buildings API
-        api_url = f"{os.getenv('SAFERPLACES_API_ROOT', 'http://localhost:5000')}/processes/safer-buildings-process/execution"
+        api_env = utils.saferplaces_api_env('safer-buildings-process')
+        api_url = api_env.api_url
         
         kwargs['bbox'] = kwargs['bbox'].to_list() if 'bbox' in kwargs else None
         
         credential_args = {
-            "user": os.getenv("SAFERPLACES_API_USER"),
-            "token": os.getenv("SAFERPLACES_API_TOKEN"),
+            "user": api_env.api_user,
+            "token": api_env.api_token,
         }
         
         debug_args = {
-            "debug": True,  # TODO: use a global _is_debug_mode() to set this
+            "debug": utils.is_debug_mode(),
         }
         
         payload = {
@@ -338,7 +322,7 @@ class SaferBuildingsTool(BaseAgentTool):
         }
         
         # DOC: Call the Safer-Buildings API
-        api_response = requests.post(api_url, json=payload)
+        api_response = utils.post_json(api_url, payload)
         
         # DOC: If the api call fails, return an error response
         if api_response.status_code != 200:
@@ -349,25 +333,25 @@ class SaferBuildingsTool(BaseAgentTool):
             }
             
         # DOC: If the API call is successful, process the response 
-        api_response = api_response.json()
+        api_response = utils.response_json(api_response)
         if api_response.get('id') == 'saferplacesapi.SaferBuildingsProcessor' and len(api_response.get('files', dict())) > 0:
             tool_response = {
                 'tool_response': api_response,
-                'updates': {
-                    # TODO: add only safer-rain related layer if not present (or maybe add with modified description telling they were used for this simulation)
-                    'layer_registry': self.graph_state.get('layer_registry', []) + [
-                        {
-                            'title': f"SaferBuildings Output",
-                            'description': f"SaferBuildings output file with flooded buildings from this inputs: ({', '.join([f'{k}: {v}' for k,v in kwargs.items() if k!='out'])})",
-                            'src': api_response['message']['body']['result']['s3_uri'],
-                            'type': 'vector',
-                            'metadata': dict()
-                        }
-                    ]
-                    if not GraphStates.src_layer_exists(self.graph_state, api_response['message']['body']['result']['s3_uri'])
-                    else []
-                }
+                'updates': dict(),
             }
+            # TODO: add only safer-rain related layer if not present (or maybe add with modified description telling they were used for this simulation)
+            # DOC: The layer_registry reducer merges by src → return only the new entry, and no key at all if the output is already registered
+            flooded_buildings_src = api_response['message']['body']['result']['s3_uri']
+            if not GraphStates.src_layer_exists(self.graph_state, flooded_buildings_src):
+                tool_response['updates']['layer_registry'] = [
+                    {
+                        'title': f"SaferBuildings Output",
+                        'description': f"SaferBuildings output file with flooded buildings from this inputs: ({', '.join(f'{k}: {v}' for k,v in kwargs.items() if k!='out' and v is not None)})",
+                        'src': flooded_buildings_src,
+                        'type': 'vector',
+                        'metadata': dict()
+                    }
+                ]
             
         # DOC: If the API call is successful but the response is not as expected, return an error response
         else:
@@ -390,17 +374,3 @@ class SaferBuildingsTool(BaseAgentTool):
     def _on_tool_end(self):
         self.execution_confirmed = False
         self.output_confirmed = True
-        
-    
-    # DOC: Try running AgentTool → Will check required, validity and inference over arguments thatn call and return _execute()
-    def _run(
-        self, 
-        /,
-        **kwargs: Any, # dict[str, Any] = None,
-    ) -> dict:
-        
-        run_manager: Optional[CallbackManagerForToolRun] = kwargs.pop("run_manager", None)
-        return super()._run(
-            tool_args = kwargs,
-            run_manager = run_manager
-        )
\ No newline at end of file